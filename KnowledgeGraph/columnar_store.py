@@ -0,0 +1,384 @@
+import itertools
+
+import numpy as np
+
+from KnowledgeGraph.nodes import BaseNode, Node
+from KnowledgeGraph.edges import BaseEdge, Edge
+
+
+class StringTable:
+    """Interns strings, assigning each distinct string an integer code."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def decode(self, code: int) -> str:
+        return self.values[code]
+
+
+def _grow(array: np.ndarray, capacity: int) -> np.ndarray:
+    """Returns a copy of array with its first dimension extended to capacity."""
+
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class ColumnarStore:
+    """
+    Array-backed storage of node and edge attributes for a KnowledgeGraph.
+
+    Nodes and edges are rows in growable NumPy columns, with content, document names and edge types held once in string
+    tables. Rows are append only: deleted edges are marked dead, deleted nodes simply stop being referenced by the graph.
+    ColumnarNode and ColumnarEdge are the views through which the rest of the program reads and writes the rows. The
+    store keeps no views: they are made on demand from a row, and two views of the same row are equal.
+    """
+
+    # Edges added since the incidence index was last built before it is rebuilt.
+    incidence_rebuild_threshold = 1024
+
+    def __init__(self, initial_capacity: int = 1024):
+        self.strings = StringTable()
+
+        self.num_nodes = 0
+        self.node_uid = np.zeros(initial_capacity, dtype=np.int64)
+        self.node_level = np.zeros(initial_capacity, dtype=np.int8)
+        self.node_id_n = np.zeros(initial_capacity, dtype=np.int32)
+        self.node_document = np.zeros(initial_capacity, dtype=np.int32)
+        self.node_content = np.zeros(initial_capacity, dtype=np.int32)
+        self.node_embedding = np.zeros((initial_capacity, 2), dtype=np.float32)
+        self.node_has_embedding = np.zeros(initial_capacity, dtype=bool)
+        # Only identifiers that differ from the default document-level:id_n format are stored.
+        self.node_identifier_overrides = {}
+
+        self.num_edges = 0
+        self.edge_uid = np.zeros(initial_capacity, dtype=np.int64)
+        self.edge_parent = np.zeros(initial_capacity, dtype=np.int32)
+        self.edge_child = np.zeros(initial_capacity, dtype=np.int32)
+        self.edge_type = np.zeros(initial_capacity, dtype=np.int32)
+        self.edge_weight = np.zeros(initial_capacity, dtype=np.int32)
+        self.edge_alive = np.zeros(initial_capacity, dtype=bool)
+
+        # Node row -> incident edge rows, in CSR form, for edges up to incidence_built_upto.
+        self.incidence_offsets = np.zeros(1, dtype=np.int64)
+        self.incidence_edges = np.zeros(0, dtype=np.int32)
+        self.incidence_built_upto = 0
+
+    def _reserve_node_rows(self, num_rows: int):
+        """Grows the node columns, by at least doubling them, if they cannot hold num_rows more rows."""
+
+        if self.num_nodes + num_rows > len(self.node_level):
+            capacity = max(2 * len(self.node_level), self.num_nodes + num_rows)
+            self.node_uid = _grow(self.node_uid, capacity)
+            self.node_level = _grow(self.node_level, capacity)
+            self.node_id_n = _grow(self.node_id_n, capacity)
+            self.node_document = _grow(self.node_document, capacity)
+            self.node_content = _grow(self.node_content, capacity)
+            self.node_embedding = _grow(self.node_embedding, capacity)
+            self.node_has_embedding = _grow(self.node_has_embedding, capacity)
+
+    def _reserve_edge_rows(self, num_rows: int):
+        """Grows the edge columns, by at least doubling them, if they cannot hold num_rows more rows."""
+
+        if self.num_edges + num_rows > len(self.edge_parent):
+            capacity = max(2 * len(self.edge_parent), self.num_edges + num_rows)
+            self.edge_uid = _grow(self.edge_uid, capacity)
+            self.edge_parent = _grow(self.edge_parent, capacity)
+            self.edge_child = _grow(self.edge_child, capacity)
+            self.edge_type = _grow(self.edge_type, capacity)
+            self.edge_weight = _grow(self.edge_weight, capacity)
+            self.edge_alive = _grow(self.edge_alive, capacity)
+
+    def _encode_all(self, values) -> np.ndarray:
+        """Encodes a column of strings, looking up each distinct string once."""
+
+        uniques, inverse = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+        codes = np.array([self.strings.encode(value) for value in uniques], dtype=np.int32)
+        return codes[inverse.reshape(-1)]
+
+    def add_node(self, level: int, id_n: int, document_name: str, content: str) -> int:
+        """
+        Appends a node row.
+
+        :return: The row of the new node.
+        """
+
+        self._reserve_node_rows(1)
+        row = self.num_nodes
+        self.node_uid[row] = next(Node._uids)
+        self.node_level[row] = level
+        self.node_id_n[row] = id_n
+        self.node_document[row] = self.strings.encode(document_name)
+        self.node_content[row] = self.strings.encode(content)
+        self.num_nodes += 1
+        return row
+
+    def add_edge(self, parent_row: int, child_row: int, edge_type: str, edge_weight: int) -> int:
+        """
+        Appends an edge row.
+
+        :return: The row of the new edge.
+        """
+
+        self._reserve_edge_rows(1)
+        row = self.num_edges
+        self.edge_uid[row] = next(Edge._uids)
+        self.edge_parent[row] = parent_row
+        self.edge_child[row] = child_row
+        self.edge_type[row] = self.strings.encode(edge_type)
+        self.edge_weight[row] = edge_weight
+        self.edge_alive[row] = True
+        self.num_edges += 1
+        return row
+
+    def _build_incidence(self):
+        """Rebuilds the node -> edge rows CSR index from all current edges in one pass."""
+
+        num_edges = self.num_edges
+        endpoints = np.concatenate((self.edge_parent[:num_edges], self.edge_child[:num_edges]))
+        edge_rows = np.concatenate((np.arange(num_edges, dtype=np.int32), np.arange(num_edges, dtype=np.int32)))
+        order = np.argsort(endpoints, kind="stable")
+
+        self.incidence_edges = edge_rows[order]
+        self.incidence_offsets = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(endpoints, minlength=self.num_nodes), out=self.incidence_offsets[1:])
+        self.incidence_built_upto = num_edges
+
+    def node_edge_rows(self, node_row: int) -> np.ndarray:
+        """
+        Returns the rows of all live edges touching a node, in order of creation.
+
+        :param node_row:
+        """
+
+        if self.num_edges - self.incidence_built_upto > self.incidence_rebuild_threshold:
+            self._build_incidence()
+
+        if node_row < len(self.incidence_offsets) - 1:
+            indexed = self.incidence_edges[self.incidence_offsets[node_row]:self.incidence_offsets[node_row + 1]]
+        else:
+            indexed = self.incidence_edges[:0]
+
+        # Edges added since the index was built are scanned directly.
+        tail_start, tail_end = self.incidence_built_upto, self.num_edges
+        tail = np.flatnonzero((self.edge_parent[tail_start:tail_end] == node_row) |
+                              (self.edge_child[tail_start:tail_end] == node_row)) + tail_start
+
+        rows = np.unique(np.concatenate((indexed, tail.astype(np.int32))))
+        return rows[self.edge_alive[rows]]
+
+    def node_identifier(self, row: int) -> str:
+        identifier = self.node_identifier_overrides.get(row)
+        if identifier is None:
+            identifier = f"{self.strings.decode(self.node_document[row])}-{self.node_level[row]}:" \
+                         f"{self.node_id_n[row]}"
+        return identifier
+
+    def new_node(self, level: int, id_n: int, document_name: str, content: str) -> "ColumnarNode":
+        """Creates a node row and returns its view."""
+
+        return ColumnarNode(self, self.add_node(level, id_n, document_name, content))
+
+    def new_edge(self, parent: "ColumnarNode", child: "ColumnarNode", edge_type: str,
+                 edge_weight: int = 1) -> "ColumnarEdge":
+        """Creates an edge row and returns its view."""
+
+        if parent.store is not self or child.store is not self:
+            raise Exception("Columnar edges can only join nodes of the same store")
+        return ColumnarEdge(self, self.add_edge(parent.row, child.row, edge_type, edge_weight))
+
+    def new_nodes(self, levels: np.ndarray, id_ns: np.ndarray, document_names: list[str],
+                  contents: list[str]) -> list["ColumnarNode"]:
+        """Creates node rows from whole columns at once and returns their views."""
+
+        num_rows = len(levels)
+        self._reserve_node_rows(num_rows)
+        rows = slice(self.num_nodes, self.num_nodes + num_rows)
+        if num_rows:
+            self.node_uid[rows] = np.fromiter(itertools.islice(Node._uids, num_rows), dtype=np.int64, count=num_rows)
+            self.node_level[rows] = levels
+            self.node_id_n[rows] = id_ns
+            self.node_document[rows] = self._encode_all(document_names)
+            self.node_content[rows] = self._encode_all(contents)
+        self.num_nodes += num_rows
+
+        return [ColumnarNode(self, row) for row in range(rows.start, rows.stop)]
+
+    def new_edges(self, parent_rows: np.ndarray, child_rows: np.ndarray, edge_types: list[str],
+                  edge_weights: np.ndarray) -> list["ColumnarEdge"]:
+        """Creates edge rows from whole columns of node rows at once and returns their views."""
+
+        num_rows = len(parent_rows)
+        self._reserve_edge_rows(num_rows)
+        rows = slice(self.num_edges, self.num_edges + num_rows)
+        if num_rows:
+            self.edge_uid[rows] = np.fromiter(itertools.islice(Edge._uids, num_rows), dtype=np.int64, count=num_rows)
+            self.edge_parent[rows] = parent_rows
+            self.edge_child[rows] = child_rows
+            self.edge_type[rows] = self._encode_all(edge_types)
+            self.edge_weight[rows] = edge_weights
+            self.edge_alive[rows] = True
+        self.num_edges += num_rows
+
+        return [ColumnarEdge(self, row) for row in range(rows.start, rows.stop)]
+
+    def memory_usage(self) -> int:
+        """Returns the number of bytes used by the node and edge columns."""
+
+        columns = [self.node_uid, self.node_level, self.node_id_n, self.node_document, self.node_content,
+                   self.node_embedding, self.node_has_embedding, self.edge_uid, self.edge_parent, self.edge_child,
+                   self.edge_type, self.edge_weight, self.edge_alive, self.incidence_offsets, self.incidence_edges]
+        return sum(column.nbytes for column in columns)
+
+
+class ViewReference:
+    """
+    Stands in for the weak references of the object model, returning the view it holds when called. Views are made on
+    demand, so a weak reference to one would die as soon as it was returned.
+    """
+
+    __slots__ = ("view",)
+
+    def __init__(self, view):
+        self.view = view
+
+    def __call__(self):
+        return self.view
+
+
+class ColumnarNode(BaseNode):
+    """A node whose attributes live in a row of a ColumnarStore."""
+
+    __slots__ = ("store", "row")
+
+    def __init__(self, store: ColumnarStore, row: int):
+        self.store = store
+        self.row = row
+
+    def __eq__(self, other) -> bool:
+        return type(other) is ColumnarNode and other.row == self.row and other.store is self.store
+
+    def __hash__(self) -> int:
+        return hash(self.row)
+
+    @property
+    def uid(self) -> int:
+        return int(self.store.node_uid[self.row])
+
+    @property
+    def identifier(self) -> str:
+        return self.store.node_identifier(self.row)
+
+    @identifier.setter
+    def identifier(self, identifier: str):
+        self.store.node_identifier_overrides[self.row] = identifier
+
+    @property
+    def id_n(self) -> int:
+        return int(self.store.node_id_n[self.row])
+
+    @id_n.setter
+    def id_n(self, id_n: int):
+        self.store.node_id_n[self.row] = id_n
+
+    @property
+    def level(self) -> int:
+        return int(self.store.node_level[self.row])
+
+    @property
+    def content(self) -> str:
+        return self.store.strings.decode(self.store.node_content[self.row])
+
+    @property
+    def document_name(self) -> str:
+        return self.store.strings.decode(self.store.node_document[self.row])
+
+    @property
+    def embedding(self):
+        if self.store.node_has_embedding[self.row]:
+            return self.store.node_embedding[self.row].copy()
+        return []
+
+    @embedding.setter
+    def embedding(self, embedding):
+        if len(embedding) != self.store.node_embedding.shape[1]:
+            raise Exception("Columnar storage only holds two dimensional embeddings")
+        self.store.node_embedding[self.row] = embedding
+        self.store.node_has_embedding[self.row] = True
+
+    @property
+    def edges(self) -> list[ViewReference]:
+        return [ViewReference(ColumnarEdge(self.store, row)) for row in self.store.node_edge_rows(self.row).tolist()]
+
+    def add_edge(self, edge: "ColumnarEdge"):
+        """Incidence is read from the store, so there is nothing to record."""
+
+    def remove_edge(self, edge_to_remove: "ColumnarEdge"):
+        """Marks the edge row as dead."""
+
+        self.store.edge_alive[edge_to_remove.row] = False
+
+    def remove_edges(self, edge_uids: set[int]):
+        """Marks the rows of the given edges of this node as dead."""
+
+        for row in self.store.node_edge_rows(self.row).tolist():
+            if int(self.store.edge_uid[row]) in edge_uids:
+                self.store.edge_alive[row] = False
+
+    def remove_incomplete_edges(self):
+        """Dead edges are already excluded by the store."""
+
+    def _new_node(self, level: int, id_n: int, document_name: str, content: str) -> "ColumnarNode":
+        return self.store.new_node(level, id_n, document_name, content)
+
+    def _new_edge(self, parent: "ColumnarNode", child: "ColumnarNode", edge_type: str) -> "ColumnarEdge":
+        return self.store.new_edge(parent, child, edge_type)
+
+
+class ColumnarEdge(BaseEdge):
+    """An edge whose attributes live in a row of a ColumnarStore."""
+
+    __slots__ = ("store", "row")
+
+    def __init__(self, store: ColumnarStore, row: int):
+        self.store = store
+        self.row = row
+
+    def __eq__(self, other) -> bool:
+        return type(other) is ColumnarEdge and other.row == self.row and other.store is self.store
+
+    def __hash__(self) -> int:
+        return hash(self.row)
+
+    @property
+    def uid(self) -> int:
+        return int(self.store.edge_uid[self.row])
+
+    @property
+    def edge_type(self) -> str:
+        return self.store.strings.decode(self.store.edge_type[self.row])
+
+    @property
+    def edge_weight(self) -> int:
+        return int(self.store.edge_weight[self.row])
+
+    @edge_weight.setter
+    def edge_weight(self, edge_weight: int):
+        self.store.edge_weight[self.row] = edge_weight
+
+    @property
+    def parent_node(self) -> ViewReference:
+        return ViewReference(ColumnarNode(self.store, int(self.store.edge_parent[self.row])))
+
+    @property
+    def child_node(self) -> ViewReference:
+        return ViewReference(ColumnarNode(self.store, int(self.store.edge_child[self.row])))
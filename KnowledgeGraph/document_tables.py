@@ -0,0 +1,71 @@
+def structural_parents(levels: list[int]) -> list[int]:
+    """
+    Finds the owner of each node of a document (its nearest earlier node at a shallower level) in a single pass, by
+    keeping a stack of the nodes that could still own later ones.
+
+    :param levels: Level of each node, in document order.
+    :return: Position of the owner of each node, or -1 for nodes without one.
+    """
+
+    parents = []
+    stack = []
+    for position, level in enumerate(levels):
+        while stack and levels[stack[-1]] >= level:
+            stack.pop()
+        parents.append(stack[-1] if stack else -1)
+        stack.append(position)
+    return parents
+
+
+def build_document_tables(data: dict) -> (dict, dict):
+    """
+    Builds the nodes and edges a json-encoded document adds to a KnowledgeGraph, as plain tables, without needing the
+    graph. Documents are independent, so this can run in worker processes, with KnowledgeGraph.add_document_tables
+    assigning the id numbers once the tables are merged.
+
+    Node and edge order matches that of KnowledgeGraph.add_document_to_graph.
+
+    :param data: Structured document in json format.
+    :return: Node table (level, content and 1-based position of the node among the document's nodes at its level) and
+    edge table (parent and child positions in the node table, and type).
+    """
+
+    nodes = {"level": [], "content": [], "level_ordinal": []}
+    level_counts = {}
+
+    def add_node(level: int, content: str):
+        level_counts[level] = level_counts.get(level, 0) + 1
+        nodes["level"].append(level)
+        nodes["content"].append(content)
+        nodes["level_ordinal"].append(level_counts[level])
+
+    def add_nodes(entry: dict | list, level: int):
+        if type(entry) is list:
+            for content in entry:
+                add_node(level, content)
+        else:
+            for key in entry.keys():
+                if key != "None":
+                    add_node(level, key)
+                add_nodes(entry[key], level + 1)
+
+    add_nodes(data, level=0)
+
+    edges = {"parent": [], "child": [], "type": []}
+    num_nodes = len(nodes["level"])
+
+    # Flow edges
+    for position in range(1, num_nodes):
+        edges["parent"].append(position - 1)
+        edges["child"].append(position)
+        edges["type"].append("Flow")
+
+    # Structural edges, last node first.
+    parents = structural_parents(nodes["level"])
+    for position in reversed(range(num_nodes)):
+        if parents[position] >= 0:
+            edges["parent"].append(parents[position])
+            edges["child"].append(position)
+            edges["type"].append("Structural")
+
+    return nodes, edges
@@ -1,17 +1,22 @@
+import itertools
+import sys
 import weakref
 
 
-class Edge:
+class BaseEdge:
 
-    """Basic Edge class."""
+    """
+    Behaviour shared by all edges, whatever stores their attributes. Carries no attributes itself, so storage engines
+    can give their edges only the slots they need.
+    """
 
-    def __init__(self, parent, child, edge_type: str, edge_weight: int = 1):   # TODO: Do typing by fixing recursive import problem.
-        self.identifier = f"{parent.identifier}-{child.identifier}-{edge_type}"
-        self.edge_type = edge_type
-        self.edge_weight = edge_weight
+    __slots__ = ()
 
-        self.parent_node = weakref.ref(parent)
-        self.child_node = weakref.ref(child)
+    @property
+    def identifier(self) -> str:
+        """Rendered from the parent and child identifiers on each access, rather than stored."""
+
+        return f"{self.parent_node().identifier}-{self.child_node().identifier}-{self.edge_type}"
 
     def delete_edge(self):
         """Removes weak references to this edge from the parent and child nodes."""
@@ -24,10 +29,23 @@ class Edge:
 
         :returns bool: True if both the parent and child node are instantiated, otherwise False.
         """
-        if self.parent_node() is None:
-            print(f"Parent dead, deleting {self.identifier}")
-            return False
-        if self.child_node() is None:
-            print(f"Child dead, deleting {self.identifier}")
-            return False
-        return True
+        return self.parent_node() is not None and self.child_node() is not None
+
+
+class Edge(BaseEdge):
+
+    """Basic Edge class."""
+
+    __slots__ = ("uid", "edge_type", "edge_weight", "parent_node", "child_node", "__weakref__")
+
+    _uids = itertools.count()
+
+    def __init__(self, parent, child, edge_type: str, edge_weight: int = 1):   # TODO: Do typing by fixing recursive import problem.
+        self.uid = next(Edge._uids)
+        # Interned, as many edges share few types.
+        self.edge_type = sys.intern(edge_type)
+        self.edge_weight = edge_weight
+
+        self.parent_node = weakref.ref(parent)
+        self.child_node = weakref.ref(child)
+
@@ -1,20 +1,48 @@
+import gc
 import os
+import tempfile
+import time
+import weakref
+from contextlib import contextmanager
 import networkx as nx
 
 import matplotlib.pyplot as plt
 
 
-import spacy
 import numpy as np
+import pandas as pd
+from scipy import sparse
 
-from sklearn.decomposition import PCA
+from sklearn.decomposition import IncrementalPCA
 
 from KnowledgeGraph.graph_precursor import Graph
 from KnowledgeGraph.nodes import Node
 from KnowledgeGraph.edges import Edge
+from KnowledgeGraph.columnar_store import ColumnarStore
+from KnowledgeGraph.index_overlay import IndexOverlay
+from KnowledgeGraph.document_tables import structural_parents
 from Models.common_words import common_words
+from Models.language_models import get_spacy_model
 from Utilitites.json_operations import load_json_entity
 from Utilitites.csv_operations import save_graph_to_csv
+from Utilitites.embedding_cache import EmbeddingCache
+from Utilitites.journal_operations import GraphJournal
+
+
+@contextmanager
+def _paused_garbage_collection():
+    """
+    Pauses cyclic garbage collection while many objects are created at once, as each pass would otherwise traverse all
+    the objects created so far.
+    """
+
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
 
 
 class KnowledgeGraph(Graph):
@@ -25,14 +53,25 @@ class KnowledgeGraph(Graph):
     Principles underlying design:
     - do not store information in more than one place unless this is accomplished through weak references (thus deletion
     of one is deletion everywhere).
-    - Everything is object based
+    - Everything is object based (with the columnar storage engine, the objects are views on NumPy columns).
 
     Shouldn't use stdout at this level, rather raise exceptions.
     """
 
-    def __init__(self, graph_name: str, autosave: bool = True):
+    def __init__(self, graph_name: str, autosave: bool = True, spacy_model_name: str = "en_core_web_md",
+                 storage: str = "objects"):
         self.graph_name = graph_name
 
+        # Storage engine for node and edge attributes. Options: objects (one Python object per element), columnar
+        # (NumPy columns in a ColumnarStore, with Node and Edge objects as views on them).
+        if storage == "objects":
+            self.store = None
+        elif storage == "columnar":
+            self.store = ColumnarStore()
+        else:
+            raise Exception("Invalid storage engine given.")
+        self.storage = storage
+
         self.nodes = []
         self.edges = []
 
@@ -40,17 +79,246 @@ class KnowledgeGraph(Graph):
 
         self.available_levels = ["A", "B", "C", "D", "E"]
         self.levels_tally = [0, 0, 0, 0, 0]
-        self.spacy_model = spacy.load("en_core_web_md")
+        # The model itself is loaded on first use, and shared with all other graphs in the process.
+        self.spacy_model_name = spacy_model_name
 
         self.inferred_entity_count = 0
-        self.node_content = []
+
+        # Index of identifier -> node, kept in step with the nodes list.
+        self.node_index = {}
+        # Index of content -> nodes with that content, in order of addition.
+        self.content_index = {}
+        # Index of document name -> nodes of that document, in order of addition.
+        self.document_index = {}
+        # Inverted index of word -> nodes containing that word, for entity linking. Built on first use.
+        self._word_index = None
 
         self.autosave_graph = autosave
         self.maintained_formats = []
+        # Write-ahead journal of mutations, present while the journal format is maintained.
+        self.journal = None
 
         self.incidence_matrix = None
         self.adjacency_matrix = None
 
+        # Fitted projection of content vectors to the two dimensional node embeddings (see compute_node_embeddings).
+        self.embedding_projection = None
+
+        # True once node and edge objects are shared with another version of the graph (see snapshot). Shared nodes then
+        # also hold edges of the other versions, so edges are never unlinked from nodes, and reads of a node's edges
+        # are filtered to those in this graph using the edge uid set (built when first needed).
+        self.shares_elements = False
+        self._edge_uids = None
+        # Node and edge uids from which elements were created after the last snapshot, so are not shared. Elements below
+        # them are copied before they are changed (see _own_elements).
+        self._shared_uid_limits = None
+        # True while the nodes and edges lists are shared with another version of the graph, until either changes them.
+        self._shared_lists = False
+
+        # Weak references to nodes whose edge lists may still hold edges this graph removed without unlinking them (see
+        # _unlink_edges), to be compacted once those edges have died (see remove_invalid_edges_and_nodes).
+        self._dead_edge_holders = []
+
+        # Incremented whenever nodes or edges are added or removed, so derived structures know when to rebuild.
+        self.structure_version = 0
+        self._adjacency_matrix_version = None
+        self._incidence_matrix_version = None
+
+    @property
+    def spacy_model(self):
+        """The shared spacy model used to embed node content."""
+
+        return get_spacy_model(self.spacy_model_name)
+
+    @property
+    def word_index(self) -> dict:
+        """Inverted index of word -> nodes containing that word, built from all nodes the first time it is needed."""
+
+        if self._word_index is None:
+            self._word_index = {}
+            self._index_words(self.nodes)
+        return self._word_index
+
+    def snapshot(self, graph_name: str) -> "KnowledgeGraph":
+        """
+        Creates a new version of the graph that shares its nodes, edges and indexes with this one rather than copying
+        them. Changes to either version do not show in the other:
+        - The nodes and edges lists are shared until either version adds or removes elements, when that version copies
+        them (O(N + E) references).
+        - Each version's indexes hold only the entries it has changed since, over the shared indexes (see IndexOverlay).
+        - Node and edge objects are copied by a version just before it first changes them (see _own_elements), along
+        with its edges to any node copied.
+
+        So creating the snapshot costs O(1), and a version only pays for what it changes.
+
+        :param graph_name: Name of the new version.
+        :return: The new KnowledgeGraph.
+        """
+
+        new_graph = KnowledgeGraph(graph_name, autosave=self.autosave_graph, spacy_model_name=self.spacy_model_name)
+        new_graph.store = self.store
+        new_graph.storage = self.storage
+
+        new_graph.nodes = self.nodes
+        new_graph.edges = self.edges
+        new_graph._shared_lists = self._shared_lists = True
+        new_graph.documents_used = list(self.documents_used)
+        new_graph.levels_tally = list(self.levels_tally)
+        new_graph.inferred_entity_count = self.inferred_entity_count
+        new_graph.embedding_projection = self.embedding_projection
+
+        for index_name in ["node_index", "content_index", "document_index", "_word_index"]:
+            index = getattr(self, index_name)
+            if index is not None:
+                setattr(self, index_name, IndexOverlay.over(index))
+                setattr(new_graph, index_name, IndexOverlay.over(index))
+
+        new_graph.shares_elements = self.shares_elements = True
+        # Every element existing now is shared. Taking the next uids skips them, which is harmless.
+        new_graph._shared_uid_limits = self._shared_uid_limits = (next(Node._uids), next(Edge._uids))
+        if self._edge_uids is not None:
+            new_graph._edge_uids = set(self._edge_uids)
+
+        return new_graph
+
+    def _own_lists(self):
+        """Copies the nodes and edges lists if they are shared with another version of the graph, before they change."""
+
+        if self._shared_lists:
+            self.nodes = list(self.nodes)
+            self.edges = list(self.edges)
+            self._shared_lists = False
+
+    @staticmethod
+    def _own_index_entries(index: dict, keys):
+        """Copies the lists of an index shared with another version of the graph, before changing them in place."""
+
+        if isinstance(index, IndexOverlay):
+            index.own(keys)
+
+    def _own_elements(self, nodes: list[Node] = (), edges: list[Edge] = ()) -> (dict, dict):
+        """
+        Copy on write for versions of the graph that share elements (see snapshot). Replaces those of the given nodes
+        and edges that may be shared with another version by copies private to this graph, so that changing them leaves
+        the other versions unchanged. Copying a node also copies this graph's edges to it, as edges refer to their
+        nodes. Costs a pass over the nodes, the edges and the affected index entries, so changes should be batched.
+
+        :param nodes: Nodes about to be changed.
+        :param edges: Edges about to be changed.
+        :return: Node and edge to change in place of each given one, by uid.
+        """
+
+        owned_nodes = {node.uid: node for node in nodes}
+        owned_edges = {edge.uid: edge for edge in edges}
+        if self._shared_uid_limits is None:
+            return owned_nodes, owned_edges
+        node_uid_limit, edge_uid_limit = self._shared_uid_limits
+
+        copied_nodes = {}
+        for node in owned_nodes.values():
+            if node.uid < node_uid_limit:
+                copy = self._new_node(level=node.level, id_n=node.id_n, document_name=node.document_name,
+                                      content=node.content)
+                if copy.identifier != node.identifier:
+                    copy.identifier = node.identifier
+                if len(node.embedding) > 0:
+                    copy.embedding = node.embedding
+                copied_nodes[node.uid] = copy
+
+        replaced_edges = {edge.uid: edge for edge in owned_edges.values() if edge.uid < edge_uid_limit}
+        for node in owned_nodes.values():
+            if node.uid in copied_nodes:
+                for edge in self.node_edges(node):
+                    replaced_edges[edge.uid] = edge
+        copied_edges = {}
+        for edge in replaced_edges.values():
+            parent_node = edge.parent_node()
+            child_node = edge.child_node()
+            if parent_node is None or child_node is None:
+                continue
+            parent_node = copied_nodes.get(parent_node.uid, parent_node)
+            child_node = copied_nodes.get(child_node.uid, child_node)
+            copy = self._new_edge(parent_node, child_node, edge.edge_type, edge.edge_weight)
+            parent_node.add_edge(copy)
+            child_node.add_edge(copy)
+            copied_edges[edge.uid] = copy
+
+        if copied_nodes or copied_edges:
+            self._own_lists()
+        if copied_nodes:
+            self.nodes[:] = [copied_nodes.get(node.uid, node) for node in self.nodes]
+            originals = [owned_nodes[uid] for uid in copied_nodes]
+            for node in originals:
+                if self.node_index.get(node.identifier) == node:
+                    self.node_index[node.identifier] = copied_nodes[node.uid]
+            indexes = [(self.content_index, {node.content for node in originals}),
+                       (self.document_index, {node.document_name for node in originals})]
+            if self._word_index is not None:
+                indexes.append((self._word_index, {word for node in originals for word in node.individual_words}))
+            for index, keys in indexes:
+                for key in keys:
+                    if key in index:
+                        index[key] = [copied_nodes.get(node.uid, node) for node in index[key]]
+        if copied_edges:
+            self.edges[:] = [copied_edges.get(edge.uid, edge) for edge in self.edges]
+            self._unlink_edges(list(replaced_edges.values()))
+            self._track_edges(added=list(copied_edges.values()), removed_uids=set(copied_edges))
+            self.structure_version += 1
+
+        owned_nodes.update(copied_nodes)
+        owned_edges = {uid: copied_edges.get(uid, edge) for uid, edge in owned_edges.items()}
+        return owned_nodes, owned_edges
+
+    def node_edges(self, node: Node) -> list[Edge]:
+        """
+        Returns the edges of a node that are part of this graph.
+
+        :param node:
+        """
+
+        edges = [edge() for edge in node.edges]
+        edges = [edge for edge in edges if edge is not None]
+        if self.shares_elements:
+            if self._edge_uids is None:
+                self._edge_uids = {edge.uid for edge in self.edges}
+            edges = [edge for edge in edges if edge.uid in self._edge_uids]
+        return edges
+
+    def _track_edges(self, added: list[Edge] = (), removed_uids: set[int] = frozenset()):
+        """Keeps the edge uid set, if built, in step with the edges list."""
+
+        if self._edge_uids is not None:
+            self._edge_uids.update(edge.uid for edge in added)
+            self._edge_uids.difference_update(removed_uids)
+
+    def _unlink_edges(self, edges: list[Edge]):
+        """
+        Removes edges from their nodes' edge lists, compacting each affected list in a single pass, unless the nodes may
+        be shared with another version. Shared nodes are instead recorded to have their references to the edges removed
+        once the edges have died.
+        """
+
+        if not edges:
+            return
+        if self.shares_elements:
+            if self.store is None:
+                self._dead_edge_holders += [node for edge in edges for node in [edge.parent_node, edge.child_node]]
+            return
+        edge_uids = {edge.uid for edge in edges}
+        affected_nodes = {}
+        for edge in edges:
+            for node in [edge.parent_node(), edge.child_node()]:
+                if node is not None:
+                    affected_nodes[node.uid] = node
+        for node in affected_nodes.values():
+            node.remove_edges(edge_uids)
+
+    @property
+    def node_content(self) -> list[str]:
+        """Content of every node, in the same order as the nodes attribute."""
+
+        return [node.content for node in self.nodes]
+
     def _run_operation(self):
         """
         A method that runs every time a major operation occurs, to allow maintenance to be carried out e.g. autosave.
@@ -58,14 +326,71 @@ class KnowledgeGraph(Graph):
 
         if self.autosave_graph:
             for f in self.maintained_formats:
-                ...  # TODO: Autosave
+                if f == "journal" and self.journal is not None:
+                    self.journal.sync_if_due()
+                    if self.journal.needs_compaction():
+                        self.journal.compact(self)
+
+    def maintain_format(self, file_format: str, directory: str = "Data/Journals"):
+        """
+        Adds a format the graph is autosaved to as operations are run.
+
+        :param file_format: Options: journal (an append-only log of mutations, compacted into binary snapshots).
+        :param directory: Directory holding the journals of all graphs.
+        """
+
+        if file_format in self.maintained_formats:
+            return
+        if file_format == "journal":
+            self.journal = GraphJournal(self.graph_name, directory=directory)
+            # Baseline snapshot, so the journal only has to hold mutations made from here on.
+            self.journal.compact(self)
+        else:
+            raise Exception("Invalid file format given.")
+        self.maintained_formats.append(file_format)
+
+    def _journal(self, record: dict):
+        """Appends a mutation record to the journal, if one is maintained."""
+
+        if self.journal is not None:
+            self.journal.append(record)
+
+    def _journal_node(self, op: str, node: Node) -> dict:
+        return {"op": op, "level": node.level, "document_name": node.document_name, "content": node.content,
+                "id_n": node.id_n, "identifier": node.identifier, "levels_tally": list(self.levels_tally)}
+
+    def apply_journal_record(self, record: dict):
+        """
+        Repeats a mutation recorded in the journal, to recover the graph after a crash.
+
+        :param record: A journal record, as written by this class.
+        """
+
+        op = record["op"]
+        if op == "add_document":
+            self.documents_used.append(record["document_name"])
+        elif op in ["create_node", "add_node"]:
+            self.create_node(level=record["level"], document_name=record["document_name"], content=record["content"],
+                             id_n=record["id_n"], identifier=record["identifier"])
+            self.levels_tally = record["levels_tally"]
+            if record["document_name"] == "Inferred":
+                self.inferred_entity_count = max(self.inferred_entity_count, record["id_n"] + 1)
+        elif op == "create_edge":
+            self.create_edge(parent_node=self.return_node(record["parent"]),
+                             child_node=self.return_node(record["child"]), edge_type=record["edge_type"],
+                             edge_weight=record["edge_weight"])
+        elif op == "delete_node":
+            self.delete_node(record["identifier"])
+        else:
+            raise Exception(f"Invalid journal record: {op}")
 
-    def add_document_to_graph(self, data: dict, document_name: str):
+    def add_document_to_graph(self, data: dict, document_name: str, build_edges: bool = True):
         """
         Adds a json-encoded document to the graph.
 
         :param data: Structured document in json format.
         :param document_name:
+        :param build_edges: If False, only the nodes are added, and create_document_edges must be called later.
         """
 
         self._run_operation()
@@ -75,94 +400,529 @@ class KnowledgeGraph(Graph):
             return
 
         self.documents_used.append(document_name)
+        self._journal({"op": "add_document", "document_name": document_name})
         self._create_nodes(data, document_name, level=0)
-        self.create_document_edges(document_name)
+        if build_edges:
+            self.create_document_edges(document_name)
+
+    def add_document_tables(self, document_name: str, nodes: dict, edges: dict):
+        """
+        Adds a document already built into node and edge tables by build_document_tables (e.g. in a worker process),
+        assigning its nodes id numbers following on from the graph's level tallies.
+
+        :param document_name:
+        :param nodes: Node table of the document.
+        :param edges: Edge table of the document.
+        """
+
+        self._run_operation()
+
+        if document_name in self.documents_used:
+            print("Error, document name already used...")
+            return
+
+        levels = np.asarray(nodes["level"], dtype=np.int64)
+        level_counts = np.bincount(levels, minlength=len(self.levels_tally))
+        if len(level_counts) > len(self.levels_tally):
+            raise Exception("Document has more levels than the graph supports.")
+        # Same numbering as _create_nodes: each node takes the tally of its level after counting itself.
+        id_ns = np.asarray(self.levels_tally, dtype=np.int64)[levels] + np.asarray(nodes["level_ordinal"],
+                                                                                   dtype=np.int64)
+        self.levels_tally = [tally + int(count) for tally, count in zip(self.levels_tally, level_counts)]
+
+        self.documents_used.append(document_name)
+        self._journal({"op": "add_document", "document_name": document_name})
+        new_nodes = self.import_nodes(levels=levels, document_names=[document_name] * len(levels),
+                                      contents=nodes["content"], id_ns=id_ns)
+        self.import_edges(sources=edges["parent"], targets=edges["child"], edge_types=edges["type"], nodes=new_nodes)
+
+    def _edge_node_indices(self) -> (np.ndarray, np.ndarray, np.ndarray):
+        """
+        Maps every edge whose nodes are both in the graph to the integer positions of its parent and child nodes.
+
+        :return: Edge positions, parent node positions and child node positions.
+        """
+
+        num_nodes = len(self.nodes)
+        num_edges = len(self.edges)
+        if num_nodes == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+
+        if self.store is not None:
+            # Endpoints are read straight from the store's columns, mapped from store rows to node positions.
+            row_positions = np.full(self.store.num_nodes, -1, dtype=np.int64)
+            row_positions[np.fromiter((node.row for node in self.nodes), dtype=np.int64, count=num_nodes)] = \
+                np.arange(num_nodes)
+            edge_rows = np.fromiter((edge.row for edge in self.edges), dtype=np.int64, count=num_edges)
+            parent_positions = row_positions[self.store.edge_parent[edge_rows]]
+            child_positions = row_positions[self.store.edge_child[edge_rows]]
+        else:
+            # Endpoint uids, -1 where the node no longer exists, are looked up among the sorted uids of the nodes.
+            node_uids = np.fromiter((node.uid for node in self.nodes), dtype=np.int64, count=num_nodes)
+            uid_order = np.argsort(node_uids)
+            sorted_uids = node_uids[uid_order]
+            positions = []
+            for endpoint in ["parent_node", "child_node"]:
+                endpoints = (getattr(edge, endpoint)() for edge in self.edges)
+                endpoint_uids = np.fromiter((-1 if node is None else node.uid for node in endpoints),
+                                            dtype=np.int64, count=num_edges)
+                found = np.minimum(np.searchsorted(sorted_uids, endpoint_uids), num_nodes - 1)
+                positions.append(np.where(sorted_uids[found] == endpoint_uids, uid_order[found], -1))
+            parent_positions, child_positions = positions
+
+        edge_positions = np.flatnonzero((parent_positions >= 0) & (child_positions >= 0))
+        return edge_positions, parent_positions[edge_positions].astype(np.int32), \
+            child_positions[edge_positions].astype(np.int32)
 
     def compute_adjacency_matrix(self):
         """
         Produces adjacency (connectivity) matrix for the graph and assigns it to an attribute. This encodes which nodes
         are connected (and by how many edges). Direction of edges is specified according to start node being row.
 
-        The adjacency matrix has N rows and N columns, N being the total number of nodes in the graph.
+        The adjacency matrix is a sparse CSR matrix with N rows and N columns, N being the total number of nodes in the
+        graph. Rows and columns follow the order of the nodes attribute.
         """
 
-        node_identifiers = [node.identifier for node in self.nodes]
-        num_nodes = len(node_identifiers)
-        adjacency_matrix = np.zeros((num_nodes, num_nodes))
-        for edge in self.edges:
-            start_node_index = node_identifiers.index(edge[0])
-            end_node_index = node_identifiers.index(edge[1])
-            adjacency_matrix[start_node_index, end_node_index] += 1
+        num_nodes = len(self.nodes)
+        _, parent_positions, child_positions = self._edge_node_indices()
+
+        # Repeated (parent, child) entries are summed on conversion, counting the edges between the two nodes.
+        adjacency_matrix = sparse.coo_matrix((np.ones(len(parent_positions)), (parent_positions, child_positions)),
+                                             shape=(num_nodes, num_nodes)).tocsr()
 
         self.adjacency_matrix = adjacency_matrix
+        self._adjacency_matrix_version = self.structure_version
 
     def compute_incidence_matrix(self):
         """
         Produces incidence matrix for the graph and assigns it to an attribute. This encodes which nodes and which edges
         touch. Direction is provided sign of entry. Note that reciprocal opposite edges will therefore cancel out.
 
-        The incidence matrix has N rows and E columns, N being the total number of nodes in the graph, and E being the
-        total number of edges.
+        The incidence matrix is a sparse CSR matrix with N rows and E columns, N being the total number of nodes in the
+        graph, and E being the total number of edges. Rows follow the order of the nodes attribute and columns the order
+        of the edges attribute.
         """
-        node_identifiers = [node.identifier for node in self.nodes]
 
-        num_nodes = len(node_identifiers)
+        num_nodes = len(self.nodes)
         num_edges = len(self.edges)
+        edge_positions, parent_positions, child_positions = self._edge_node_indices()
 
-        incidence_matrix = np.zeros((num_nodes, num_edges))
-        for e, edge in enumerate(self.edges):
-            start_node_index = node_identifiers.index(edge.parent_node)
-            end_node_index = node_identifiers.index(edge.child_node)
-
-            incidence_matrix[start_node_index, e] += 1
-            incidence_matrix[end_node_index, e] -= 1
+        rows = np.concatenate((parent_positions, child_positions))
+        columns = np.concatenate((edge_positions, edge_positions))
+        values = np.concatenate((np.ones(len(parent_positions)), -np.ones(len(child_positions))))
+        incidence_matrix = sparse.coo_matrix((values, (rows, columns)), shape=(num_nodes, num_edges)).tocsr()
 
         self.incidence_matrix = incidence_matrix
+        self._incidence_matrix_version = self.structure_version
+
+    def get_adjacency_matrix(self) -> sparse.csr_matrix:
+        """
+        Returns the adjacency matrix, only recomputing it if nodes or edges have changed since it was last computed.
+
+        :return: Sparse adjacency matrix.
+        """
+
+        if self._adjacency_matrix_version != self.structure_version:
+            self.compute_adjacency_matrix()
+        return self.adjacency_matrix
+
+    def get_incidence_matrix(self) -> sparse.csr_matrix:
+        """
+        Returns the incidence matrix, only recomputing it if nodes or edges have changed since it was last computed.
+
+        :return: Sparse incidence matrix.
+        """
+
+        if self._incidence_matrix_version != self.structure_version:
+            self.compute_incidence_matrix()
+        return self.incidence_matrix
 
     def remove_invalid_edges_and_nodes(self):
         """
-        Checks all edge/nodes to see if their weak references to their nodes/edges are Nonetypes i.e. the node no
-        longer exists. If this is the case, deletes the edge.
+        Removes references to edges that no longer exist from the nodes.
 
-        Needs to be called regularly.
+        The graph removes a node's edges along with it, and unlinks removed edges from their nodes, so its edges cannot
+        dangle. Only nodes shared with another version keep references to removed edges (see _unlink_edges), and these
+        nodes are recorded as the edges are removed, so this only visits the recorded nodes rather than sweeping the
+        whole graph.
         """
 
         self._run_operation()
 
-        to_remove = []
-        for i, edge in enumerate(self.edges):
-            if not edge.check_connected():
-                to_remove.append(i)
-        for i in reversed(to_remove):
-            del self.edges[i]
-
-        # Check all weak references in Node objects to edges
-        for node in self.nodes:
-            node.remove_incomplete_edges()
+        holders, self._dead_edge_holders = self._dead_edge_holders, []
+        compacted_nodes = set()
+        for node_reference in holders:
+            node = node_reference()
+            if node is not None and node.uid not in compacted_nodes:
+                compacted_nodes.add(node.uid)
+                node.remove_incomplete_edges()
 
-    def create_node(self, level: int, document_name: str, content: str) -> Node:
+    def create_node(self, level: int, document_name: str, content: str, id_n: int = None,
+                    identifier: str = None) -> Node:
         """
         Instantiates a Node object
 
         :param level: How many levels down in the document the content came from.
         :param document_name: Document from which the content comes.
         :param content: Content assigned to the node.
+        :param id_n: Overrides the id number otherwise assigned from the tallies (e.g. when loading a saved graph).
+        :param identifier: Overrides the identifier otherwise built by the Node (e.g. when loading a saved graph).
         :return: The instantiated Node object.
         """
 
-        if document_name != "Inferred":
-            id_n = self.levels_tally[level]
-        else:
-            id_n = self.inferred_entity_count
-        new_node = Node(level=level,
-                        id_n=id_n,
-                        document_name=document_name,
-                        content=content)
+        if id_n is None:
+            if document_name != "Inferred":
+                id_n = self.levels_tally[level]
+            else:
+                id_n = self.inferred_entity_count
+        new_node = self._new_node(level=level, id_n=id_n, document_name=document_name, content=content)
+        if identifier is not None:
+            new_node.identifier = identifier
+        self._own_lists()
         self.nodes.append(new_node)
-        self.node_content.append(content)
+        self._index_node(new_node)
+        self.structure_version += 1
+        if self.journal is not None:
+            self.journal.append(self._journal_node("create_node", new_node))
 
         return new_node
 
+    def _new_node(self, level: int, id_n: int, document_name: str, content: str) -> Node:
+        """Instantiates a Node in the graph's storage engine, without adding it to the graph."""
+
+        if self.store is not None:
+            return self.store.new_node(level, id_n, document_name, content)
+        return Node(level=level, id_n=id_n, document_name=document_name, content=content)
+
+    def _new_edge(self, parent_node: Node, child_node: Node, edge_type: str, edge_weight: int = 1) -> Edge:
+        """Instantiates an Edge in the graph's storage engine, without adding it to the graph."""
+
+        if self.store is not None:
+            return self.store.new_edge(parent_node, child_node, edge_type, edge_weight)
+        return Edge(parent_node, child_node, edge_type, edge_weight)
+
+    def add_nodes(self, nodes: list[Node]):
+        """
+        Adds already instantiated nodes (e.g. from another graph) to the graph, keeping the indexes up to date.
+
+        :param nodes: Nodes to add.
+        """
+
+        self._own_lists()
+        for node in nodes:
+            self.nodes.append(node)
+            self._index_node(node)
+            if self.journal is not None:
+                self.journal.append(self._journal_node("add_node", node))
+        self.structure_version += 1
+
+    def add_edges(self, edges: list[Edge]):
+        """
+        Adds already instantiated edges (e.g. from another graph) to the graph. Their nodes must already hold
+        references to them.
+
+        :param edges: Edges to add.
+        """
+
+        self._own_lists()
+        self.edges += edges
+        self._track_edges(added=edges)
+        self.structure_version += 1
+        if self.journal is not None:
+            for edge in edges:
+                self._journal_edge(edge)
+
+    def _journal_edge(self, edge: Edge):
+        self.journal.append({"op": "create_edge", "parent": edge.parent_node().identifier,
+                             "child": edge.child_node().identifier, "edge_type": edge.edge_type,
+                             "edge_weight": edge.edge_weight})
+
+    def import_nodes(self, levels: np.ndarray, document_names: list[str], contents: list[str], id_ns: np.ndarray,
+                     identifiers: list[str] = None) -> list[Node]:
+        """
+        Bulk counterpart of create_node, creating nodes from whole columns (e.g. those of a saved graph).
+
+        :param levels: Level of each node.
+        :param document_names: Document of each node.
+        :param contents: Content of each node.
+        :param id_ns: Id number of each node.
+        :param identifiers: Identifier of each node, None where the default identifier applies.
+        :return: The new nodes, in the order of the columns.
+        """
+
+        levels = np.asarray(levels)
+        id_ns = np.asarray(id_ns)
+        with _paused_garbage_collection():
+            if self.store is not None:
+                new_nodes = self.store.new_nodes(levels, id_ns, document_names, contents)
+            else:
+                new_nodes = [Node(level=level, id_n=id_n, document_name=document_name, content=content)
+                             for level, id_n, document_name, content in zip(levels.tolist(), id_ns.tolist(),
+                                                                            document_names, contents)]
+            # Default identifiers are rendered from the columns, rather than read back node by node.
+            node_identifiers = [f"{document_name}-{level}:{id_n}" for document_name, level, id_n in
+                                zip(document_names, levels.tolist(), id_ns.tolist())]
+            if identifiers is not None:
+                for i, (node, identifier) in enumerate(zip(new_nodes, identifiers)):
+                    if identifier is not None and identifier != node_identifiers[i]:
+                        node.identifier = node_identifiers[i] = identifier
+
+            self._own_lists()
+            self.nodes += new_nodes
+            self._index_nodes(new_nodes, node_identifiers, contents, document_names)
+        self.structure_version += 1
+        if self.journal is not None:
+            for node in new_nodes:
+                self.journal.append(self._journal_node("add_node", node))
+
+        return new_nodes
+
+    def import_edges(self, sources, targets, edge_types: list[str], edge_weights: np.ndarray = None,
+                     nodes: list[Node] = None) -> list[Edge]:
+        """
+        Bulk counterpart of create_edge, creating edges from whole columns (e.g. those of a saved graph).
+
+        :param sources: Parent of each edge: a node identifier or, if nodes is given, a position in nodes.
+        :param targets: Child of each edge, given in the same way as sources.
+        :param edge_types: Type of each edge.
+        :param edge_weights: Weight of each edge, all 1 if not given.
+        :param nodes: Nodes the sources and targets are positions in. Otherwise they are looked up in the graph.
+        :return: The new edges, in the order of the columns.
+        """
+
+        if nodes is None:
+            # Identifiers are resolved in one vectorised join against the node index.
+            node_identifiers = pd.Index(list(self.node_index.keys()))
+            nodes = list(self.node_index.values())
+            sources = node_identifiers.get_indexer(sources)
+            targets = node_identifiers.get_indexer(targets)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if (sources < 0).any() or (targets < 0).any():
+            raise Exception("Edges refer to nodes that are not in the graph")
+        if edge_weights is None:
+            edge_weights = np.ones(len(sources), dtype=np.int64)
+        edge_weights = np.asarray(edge_weights)
+
+        with _paused_garbage_collection():
+            if self.store is not None:
+                if any(node.store is not self.store for node in nodes):
+                    raise Exception("Columnar edges can only join nodes of the same store")
+                node_rows = np.array([node.row for node in nodes], dtype=np.int32)
+                new_edges = self.store.new_edges(node_rows[sources], node_rows[targets], edge_types, edge_weights)
+            else:
+                new_edges = [Edge(nodes[source], nodes[target], edge_type, edge_weight)
+                             for source, target, edge_type, edge_weight in zip(sources.tolist(), targets.tolist(),
+                                                                               edge_types, edge_weights.tolist())]
+                self._attach_edges(new_edges, sources, targets, nodes)
+
+        self._own_lists()
+        self.edges += new_edges
+        self._track_edges(added=new_edges)
+        self.structure_version += 1
+        if self.journal is not None:
+            for edge in new_edges:
+                self._journal_edge(edge)
+
+        return new_edges
+
+    @staticmethod
+    def _attach_edges(edges: list[Edge], sources: np.ndarray, targets: np.ndarray, nodes: list[Node]):
+        """
+        Bulk counterpart of Node.add_edge, adding new edges to the edge lists of their nodes with one extend per node
+        rather than two appends per edge. Each node's edges keep the order add_edge would give them.
+
+        :param edges: The new edges.
+        :param sources: Position of the parent of each edge in nodes.
+        :param targets: Position of the child of each edge in nodes.
+        :param nodes: Nodes the sources and targets are positions in.
+        """
+
+        if not edges:
+            return
+        # Parent and child of each edge interleaved, then grouped by node with a stable sort.
+        endpoints = np.empty(2 * len(edges), dtype=np.int64)
+        endpoints[0::2] = sources
+        endpoints[1::2] = targets
+        order = np.argsort(endpoints, kind="stable")
+        references = np.empty(len(edges), dtype=object)
+        references[:] = [weakref.ref(edge) for edge in edges]
+        references = references[order // 2].tolist()
+
+        grouped_endpoints = endpoints[order]
+        boundaries = np.flatnonzero(np.diff(grouped_endpoints)) + 1
+        starts = np.concatenate(([0], boundaries)).tolist()
+        ends = np.concatenate((boundaries, [len(grouped_endpoints)])).tolist()
+        for node_position, start, end in zip(grouped_endpoints[starts].tolist(), starts, ends):
+            nodes[node_position].edges.extend(references[start:end])
+
+    def _index_nodes(self, nodes: list[Node], identifiers: list[str] = None, contents: list[str] = None,
+                     document_names: list[str] = None):
+        """
+        Registers many nodes in all the graph indexes.
+
+        :param nodes: The nodes to index.
+        :param identifiers: Identifier of each node, if already known. Otherwise read from the nodes.
+        :param contents: Content of each node, if already known. Otherwise read from the nodes.
+        :param document_names: Document of each node, if already known. Otherwise read from the nodes.
+        """
+
+        if identifiers is None:
+            identifiers = [node.identifier for node in nodes]
+        if contents is None:
+            contents = [node.content for node in nodes]
+        if document_names is None:
+            document_names = [node.document_name for node in nodes]
+
+        self._own_index_entries(self.content_index, set(contents))
+        self._own_index_entries(self.document_index, set(document_names))
+        for node, identifier, content, document_name in zip(nodes, identifiers, contents, document_names):
+            self.node_index[identifier] = node
+            if content in self.content_index:
+                self.content_index[content].append(node)
+            else:
+                self.content_index[content] = [node]
+            if document_name in self.document_index:
+                self.document_index[document_name].append(node)
+            else:
+                self.document_index[document_name] = [node]
+
+        if self._word_index is not None:
+            self._index_words(nodes)
+
+    def _index_words(self, nodes: list[Node]):
+        """
+        Adds many nodes to the word index, splitting each distinct content into words only once.
+
+        :param nodes: The nodes to index.
+        """
+
+        content_words = {}
+        for node in nodes:
+            content = node.content
+            words = content_words.get(content)
+            if words is None:
+                words = content_words[content] = list(dict.fromkeys(node.individual_words))
+                self._own_index_entries(self._word_index, words)
+            for word in words:
+                if word in self._word_index:
+                    self._word_index[word].append(node)
+                else:
+                    self._word_index[word] = [node]
+
+    def _index_node(self, node: Node):
+        """
+        Registers a node in all the graph indexes.
+
+        :param node: The node to index.
+        """
+
+        self._own_index_entries(self.content_index, [node.content])
+        self._own_index_entries(self.document_index, [node.document_name])
+        self.node_index[node.identifier] = node
+        if node.content in self.content_index:
+            self.content_index[node.content].append(node)
+        else:
+            self.content_index[node.content] = [node]
+        if node.document_name in self.document_index:
+            self.document_index[node.document_name].append(node)
+        else:
+            self.document_index[node.document_name] = [node]
+        self._index_node_words(node)
+
+    def _unindex_node(self, node: Node):
+        """
+        Removes a node from all the graph indexes.
+
+        :param node: The node to remove from the indexes.
+        """
+
+        self._own_index_entries(self.content_index, [node.content])
+        self._own_index_entries(self.document_index, [node.document_name])
+        if self.node_index.get(node.identifier) == node:
+            del self.node_index[node.identifier]
+
+        same_content = self.content_index.get(node.content, [])
+        for i, indexed_node in enumerate(same_content):
+            if indexed_node == node:
+                del same_content[i]
+                break
+        if not same_content:
+            self.content_index.pop(node.content, None)
+
+        same_document = self.document_index.get(node.document_name, [])
+        for i, indexed_node in enumerate(same_document):
+            if indexed_node == node:
+                del same_document[i]
+                break
+        if not same_document:
+            self.document_index.pop(node.document_name, None)
+
+        self._unindex_node_words(node)
+
+    def _unindex_nodes(self, nodes: list[Node]):
+        """
+        Removes many nodes from all the graph indexes, filtering each affected index entry once.
+
+        :param nodes: The nodes to remove from the indexes.
+        """
+
+        uids = {node.uid for node in nodes}
+        for node in nodes:
+            if self.node_index.get(node.identifier) == node:
+                del self.node_index[node.identifier]
+
+        indexes = [(self.content_index, {node.content for node in nodes}),
+                   (self.document_index, {node.document_name for node in nodes})]
+        if self._word_index is not None:
+            indexes.append((self._word_index, {word for node in nodes for word in node.individual_words}))
+        for index, keys in indexes:
+            for key in keys:
+                remaining = [node for node in index.get(key, []) if node.uid not in uids]
+                if remaining:
+                    index[key] = remaining
+                else:
+                    index.pop(key, None)
+
+    def _index_node_words(self, node: Node):
+        """
+        Adds a node to the posting list of each distinct word it contains. Nothing to do until the index is built.
+
+        :param node: The node to index.
+        """
+
+        if self._word_index is None:
+            return
+        words = list(dict.fromkeys(node.individual_words))
+        self._own_index_entries(self._word_index, words)
+        for word in words:
+            if word in self._word_index:
+                self._word_index[word].append(node)
+            else:
+                self._word_index[word] = [node]
+
+    def _unindex_node_words(self, node: Node):
+        """
+        Removes a node from the posting list of each distinct word it contains.
+
+        :param node: The node to remove from the index.
+        """
+
+        if self._word_index is None:
+            return
+        words = list(dict.fromkeys(node.individual_words))
+        self._own_index_entries(self._word_index, words)
+        for word in words:
+            postings = self._word_index.get(word)
+            if postings is None:
+                continue
+            for i, posted_node in enumerate(postings):
+                if posted_node == node:
+                    del postings[i]
+                    break
+            if not postings:
+                del self._word_index[word]
+
     def _create_nodes(self, data: dict, document_name: str, level: int):
         """
         Recursive method that creates nodes out of all the entries in a json document.
@@ -193,34 +953,28 @@ class KnowledgeGraph(Graph):
         :param document_name: Name of the document.
         """
 
-        document_nodes = [node for node in self.nodes if node.document_name == document_name]
+        document_nodes = self.document_index.get(document_name, [])
 
         for i, node in enumerate(document_nodes[1:]):
             self.create_edge(parent_node=document_nodes[i], child_node=node, edge_type="Flow")
 
     def _build_structural_edges(self, document_name: str):
         """
-        Builds edges which represent ownership i.e. document owns headings, headings own paragraphs.
+        Builds edges which represent ownership i.e. document owns headings, headings own paragraphs. The owner of a node
+        is the nearest earlier node at a shallower level.
 
         :param document_name: Name of the document.
         """
 
-        document_nodes = [node for node in self.nodes if node.document_name == document_name]
+        document_nodes = self.document_index.get(document_name, [])
+        owners = structural_parents([node.level for node in document_nodes])
 
-        for i, node in enumerate(reversed(document_nodes)):
-            node_level = node.level
-            possible_owners = document_nodes[:-(i+1)]
+        for i in reversed(range(len(document_nodes))):
+            if owners[i] >= 0:
+                self.create_edge(parent_node=document_nodes[owners[i]], child_node=document_nodes[i],
+                                 edge_type="Structural")
 
-            for p in reversed(possible_owners):
-                p_level = p.level
-
-                if p_level < node_level:
-                    # It's the owner
-                    self.create_edge(parent_node=p, child_node=node, edge_type="Structural")
-
-                    break
-
-    def create_edge(self, parent_node: Node, child_node: Node, edge_type: str):
+    def create_edge(self, parent_node: Node, child_node: Node, edge_type: str, edge_weight: int = 1) -> Edge:
         """
         Creates an edge object for two specified nodes and adds a weakref to each node of this edge.
 
@@ -229,12 +983,21 @@ class KnowledgeGraph(Graph):
         :param parent_node: Parent node
         :param child_node: Child node
         :param edge_type: Indicated edge type e.g. structural, flow
+        :param edge_weight: Weight of the edge.
+        :return: The instantiated Edge object.
         """
 
-        new_edge = Edge(parent_node, child_node, edge_type)
+        new_edge = self._new_edge(parent_node, child_node, edge_type, edge_weight)
+        self._own_lists()
         self.edges.append(new_edge)
+        self._track_edges(added=[new_edge])
         parent_node.add_edge(new_edge)
         child_node.add_edge(new_edge)
+        self.structure_version += 1
+        if self.journal is not None:
+            self._journal_edge(new_edge)
+
+        return new_edge
 
     def create_document_edges(self, document_name: str):
         """
@@ -254,33 +1017,40 @@ class KnowledgeGraph(Graph):
     def harvest_entity_links(self):
         """
         Produces potential entity links within the graph.
-        1. Goes through all nodes
-        2. Checks if any words match between the nodes
+        1. Goes through each word in the word index.
+        2. Takes the nodes that share the word (its posting list).
         3. Creates a new node to represent the inferred entity.
-        4. Links both original nodes to that node.
+        4. Links each of those nodes to that node, once per node.
 
-        Be sure to check the created edges don't already exist -
+        Only nodes present when harvesting starts are linked. Inferred entities are created in the order the pairwise
+        comparison of nodes would first find their word: by the first node containing it, then the second, then the
+        position of the word in the first node.
         """
 
         self._run_operation()
 
-        starting_nodes = len(self.nodes)
+        starting_nodes = {node.uid: position for position, node in enumerate(self.nodes)}
 
-        for i in range(starting_nodes):
-            node_1 = self.nodes[i]
-            for j in range(starting_nodes):
-                node_2 = self.nodes[j]
-                if i == j:
-                    pass
-                else:
-                    for word_1 in node_1.individual_words:
-                        for word_2 in node_2.individual_words:
-                            if word_1 == word_2:
-                                new_node = self._create_new_inferred_entity(word_1)
-                                if new_node is not None:
-                                    self.create_edge(parent_node=new_node, child_node=node_1, edge_type=f"Keyword-{word_1}")
-                                    self.create_edge(parent_node=new_node, child_node=node_2,
-                                                     edge_type=f"Keyword-{word_1}")
+        # Snapshot the postings, as creating inferred entities adds to the index.
+        shared_words = []
+        for word, postings in self.word_index.items():
+            postings = sorted((node for node in postings if node.uid in starting_nodes),
+                              key=lambda posted_node: starting_nodes[posted_node.uid])
+            if len(postings) >= 2:
+                shared_words.append((word, postings))
+
+        def discovery_order(shared_word: tuple) -> (int, int, int):
+            word, postings = shared_word
+            first_words = list(dict.fromkeys(postings[0].individual_words))
+            return starting_nodes[postings[0].uid], starting_nodes[postings[1].uid], first_words.index(word)
+
+        shared_words.sort(key=discovery_order)
+
+        for word, postings in shared_words:
+            new_node = self._create_new_inferred_entity(word)
+            if new_node is not None:
+                for node in postings:
+                    self.create_edge(parent_node=new_node, child_node=node, edge_type=f"Keyword-{word}")
 
     def _create_new_inferred_entity(self, content: str) -> Node:
         """
@@ -293,9 +1063,8 @@ class KnowledgeGraph(Graph):
         # TODO: instead of checking every word, could remove all the simple words from the node contents to begin with
         #  for the purpose of this search - might be easier to wipe them all out first.
 
-        all_node_content = self.node_content
-        if content in all_node_content:
-            return self.nodes[all_node_content.index(content)]
+        if content in self.content_index:
+            return self.content_index[content][0]
         else:
             if content not in common_words:
                 new_entity = self.create_node(level=0, document_name="Inferred", content=content)
@@ -310,34 +1079,138 @@ class KnowledgeGraph(Graph):
         :returns node: The specified node.
         """
 
-        # TODO: Look for a more efficient way of doing this.
-        for node in self.nodes:
-            if node.identifier == node_identifier:
-                return node
-        raise Exception("Node does not exist")
+        try:
+            return self.node_index[node_identifier]
+        except KeyError:
+            raise Exception("Node does not exist")
+
+    def return_node_by_content(self, content: str) -> Node:
+        """
+        Returns the first added node whose content matches the specified content.
+
+        :param content:
+        :returns node: The specified node.
+        """
 
-    def compute_node_embeddings(self):
+        try:
+            return self.content_index[content][0]
+        except KeyError:
+            raise Exception("Node does not exist")
+
+    def compute_node_embeddings(self, batch_size: int = 256, n_process: int = 1,
+                                embedding_cache: EmbeddingCache = None, chunk_size: int = 4096, refit: bool = False,
+                                progress_callback=None) -> (int, int, float):
         """
         Uses spacy to embed each node content in vector space, then reduces this vector to its two principal components.
 
+        Node contents are streamed through the spacy model in batches with every pipeline component disabled, as the
+        document vector only needs the tokenizer and the static word vectors. Each distinct content is only embedded
+        once, and contents already in the embedding cache are not embedded again. Vectors are spooled to a temporary
+        memory-mapped file, and the principal components are fitted with IncrementalPCA a chunk of nodes at a time, so
+        the full embedding matrix is never held in memory.
+
+        The fitted projection is kept in the embedding_projection attribute. Once it exists, only nodes without an
+        embedding (e.g. those added since) are embedded and projected with it, leaving the positions of the others
+        unchanged.
+
         Saves this to an attribute for each node within the Node class.
+
+        :param batch_size: Number of node contents passed to each spacy worker at a time.
+        :param n_process: Number of processes spacy uses to embed the contents.
+        :param embedding_cache: Optional persistent cache of embeddings for the spacy model in use.
+        :param chunk_size: Number of node vectors fitted or projected at a time.
+        :param refit: If True, the projection is fitted again from all nodes, and all nodes are projected with it.
+        :param progress_callback: Optional function called with the number of contents embedded so far and the number to
+        embed, after each batch.
+        :return: Number of contents embedded, number found in the embedding cache, and seconds taken to embed them.
         """
 
         self._run_operation()
 
-        node_embeddings = []
-        # Note that this method fails if a word is not in the model e.g. here: perspectivism.
-        for node in self.nodes:
-            embedding = self.spacy_model(node.content)
-            node_embeddings.append(embedding.vector)
-
-        # Dimensionality reduction
-        node_embeddings = np.array(node_embeddings)
-        pca = PCA(n_components=2)
-        reduced_embeddings = pca.fit_transform(node_embeddings)
+        start_time = time.perf_counter()
 
-        for i, node in enumerate(self.nodes):
-            self.nodes[i].embedding = reduced_embeddings[i]
+        refit = refit or self.embedding_projection is None
+        if refit:
+            nodes = self.nodes
+        else:
+            nodes = [node for node in self.nodes if len(node.embedding) == 0]
+        if not nodes:
+            return 0, 0, 0.0
+        # The nodes may be shared with another version, so their embeddings are set on copies.
+        owned_nodes, _ = self._own_elements(nodes=nodes)
+        nodes = [owned_nodes[node.uid] for node in nodes]
+
+        unique_contents = list(dict.fromkeys(node.content for node in nodes))
+        content_rows = {content: row for row, content in enumerate(unique_contents)}
+        spooled_vectors = None
+
+        def spool(rows: list[int], vectors: list[np.ndarray]):
+            nonlocal spooled_vectors
+            if spooled_vectors is None:
+                spooled_vectors = np.memmap(tempfile.TemporaryFile(), dtype=np.float32, mode="w+",
+                                            shape=(len(unique_contents), len(vectors[0])))
+            spooled_vectors[rows] = np.array(vectors, dtype=np.float32)
+
+        # Cached vectors
+        to_embed = []
+        for start in range(0, len(unique_contents), chunk_size):
+            contents = unique_contents[start:start + chunk_size]
+            if embedding_cache is not None:
+                cached_vectors = embedding_cache.get(contents)
+            else:
+                cached_vectors = [None] * len(contents)
+            cached_rows = [start + i for i, vector in enumerate(cached_vectors) if vector is not None]
+            if cached_rows:
+                spool(cached_rows, [vector for vector in cached_vectors if vector is not None])
+            to_embed += [content for content, vector in zip(contents, cached_vectors) if vector is None]
+
+        # New vectors
+        # Note that this method fails if a word is not in the model e.g. here: perspectivism.
+        embeddings = self.spacy_model.pipe(to_embed, batch_size=batch_size, n_process=n_process,
+                                           disable=self.spacy_model.pipe_names)
+        embedded_contents = []
+        new_vectors = []
+        num_embedded = 0
+        for content, embedding in zip(to_embed, embeddings):
+            embedded_contents.append(content)
+            new_vectors.append(embedding.vector)
+            num_embedded += 1
+            if len(new_vectors) == chunk_size or num_embedded == len(to_embed):
+                spool([content_rows[content] for content in embedded_contents], new_vectors)
+                if embedding_cache is not None:
+                    embedding_cache.put(embedded_contents, new_vectors)
+                embedded_contents = []
+                new_vectors = []
+            if progress_callback is not None and num_embedded % batch_size == 0:
+                progress_callback(num_embedded, len(to_embed))
+        if embedding_cache is not None:
+            embedding_cache.flush()
+
+        embedding_time = time.perf_counter() - start_time
+
+        # Dimensionality reduction. Chunks are split evenly, as each must hold at least as many nodes as components.
+        node_rows = np.array([content_rows[node.content] for node in nodes], dtype=np.int64)
+        chunks = np.array_split(node_rows, max(1, len(node_rows) // chunk_size))
+        if refit:
+            if len(node_rows) < 2:
+                raise Exception("At least two nodes are needed to fit the embedding projection.")
+            projection = IncrementalPCA(n_components=2)
+            for rows in chunks:
+                projection.partial_fit(spooled_vectors[rows])
+            self.embedding_projection = projection
+
+        position = 0
+        for rows in chunks:
+            reduced_embeddings = self.embedding_projection.transform(spooled_vectors[rows])
+            for reduced_embedding in reduced_embeddings:
+                nodes[position].embedding = reduced_embedding
+                position += 1
+
+        # Embeddings are not journaled, so the journal restarts from a snapshot that includes them.
+        if self.journal is not None:
+            self.journal.compact(self)
+
+        return len(to_embed), len(unique_contents) - len(to_embed), embedding_time
 
     def display_graph_networkx(self):
         """
@@ -399,46 +1272,187 @@ class KnowledgeGraph(Graph):
     def delete_node(self, node_id: str):
         """
         Deletes a node and all associated edges.
-        1. Find node via id.
-        2. del node
-        3. Identifies edges (inefficiently)
-        4. Deletes edge using its method, which should remove weakrefs to it in the other Nodes.
 
         :param node_id:
         """
 
-        node_ids = [node.identifier for node in self.nodes]
-        node_index = node_ids.index(node_id)
+        self.delete_nodes([node_id])
 
-        # Delete node content shorthand
-        del self.node_content[node_index]
-
-        # Find location of edges
-        edges_to_delete = self.nodes[node_index].edges
-        edges_to_delete_ids = [edge().identifier for edge in edges_to_delete]
-        edge_ids = [edge.identifier for edge in self.edges]
-        edge_indexes = [edge_ids.index(edge_id) for edge_id in edges_to_delete_ids]
+    def delete_nodes(self, node_ids: list[str]):
+        """
+        Deletes many nodes and all associated edges at once.
+        1. Find the nodes via the identifier index.
+        2. Marks them and their edges as deleted.
+        3. Compacts the nodes, the edges and the edge lists of the other nodes those edges touched (unless the nodes are
+        shared with another version of the graph) in a single pass each, and removes the nodes from the indexes.
 
-        # Delete edges
-        for edge_i in reversed(edge_indexes):
-            self.edges[edge_i].delete_edge()
-            del self.edges[edge_i]
+        :param node_ids:
+        """
 
-        # Delete node
-        del self.nodes[node_index]
+        self._delete_nodes([self.return_node(node_id) for node_id in node_ids])
+        for node_id in node_ids:
+            self._journal({"op": "delete_node", "identifier": node_id})
 
         # TODO: Update levels tally
 
-    def remove_node_repeats(self):
-        ...
+    def _delete_nodes(self, nodes: list[Node]):
+        """Deletes the given nodes of the graph and all their edges (see delete_nodes)."""
+
+        if not nodes:
+            return
+
+        # Tombstones
+        deleted_nodes = {node.uid: node for node in nodes}
+        deleted_edges = {}
+        for node in deleted_nodes.values():
+            for edge in self.node_edges(node):
+                deleted_edges[edge.uid] = edge
+
+        # Compaction
+        self._own_lists()
+        self._unlink_edges(list(deleted_edges.values()))
+        self.edges[:] = [edge for edge in self.edges if edge.uid not in deleted_edges]
+        self._track_edges(removed_uids=set(deleted_edges))
+        self._unindex_nodes(list(deleted_nodes.values()))
+        self.nodes[:] = [node for node in self.nodes if node.uid not in deleted_nodes]
+        self.structure_version += 1
+
+    def remove_node_repeats(self, sources: list):
+        """
+        Merges nodes with the same document, level and content that came from different sources (e.g. pages present in
+        both of two merged graphs) into the first of them, finding repeats by hashing in a single pass. Nodes are only
+        merged across sources: the k-th repeat from one source is merged into the k-th from another, so identical
+        paragraphs within one source stay separate. Edges of the repeats are moved onto the kept nodes, which can leave
+        repeated edges behind (see remove_edge_repeats).
+
+        :param sources: Label of the source (e.g. the graph) each node came from, in the order of the nodes attribute.
+        """
+
+        self._run_operation()
+
+        if len(sources) != len(self.nodes):
+            raise Exception("A source must be given for each node")
+
+        occurrences = {}
+        kept_nodes = {}
+        replacements = {}
+        for node, source in zip(self.nodes, sources):
+            key = (node.document_name, node.level, node.content)
+            occurrence = occurrences.get((source, key), 0)
+            occurrences[(source, key)] = occurrence + 1
+            kept_node = kept_nodes.setdefault((key, occurrence), node)
+            if kept_node is not node:
+                replacements[node.uid] = kept_node
+        if not replacements:
+            return
+
+        repeats = [node for node in self.nodes if node.uid in replacements]
+        moved_edges = {}
+        for node in repeats:
+            for edge in self.node_edges(node):
+                if edge.uid in moved_edges:
+                    continue
+                moved_edges[edge.uid] = edge
+                parent_node = edge.parent_node()
+                child_node = edge.child_node()
+                if parent_node is None or child_node is None:
+                    continue
+                self.create_edge(parent_node=replacements.get(parent_node.uid, parent_node),
+                                 child_node=replacements.get(child_node.uid, child_node), edge_type=edge.edge_type,
+                                 edge_weight=edge.edge_weight)
+
+        self._own_lists()
+        self._unlink_edges([edge for edge in moved_edges.values()
+                            if edge.parent_node() is not None and edge.child_node() is not None])
+        self.edges[:] = [edge for edge in self.edges if edge.uid not in moved_edges]
+        self._track_edges(removed_uids=set(moved_edges))
+        self._unindex_nodes(repeats)
+        self.nodes[:] = [node for node in self.nodes if node.uid not in replacements]
+        # A repeat may have been the indexed holder of an identifier shared with a remaining node.
+        removed_identifiers = {node.identifier for node in repeats}
+        for node in self.nodes:
+            if node.identifier in removed_identifiers:
+                self.node_index.setdefault(node.identifier, node)
+        self.structure_version += 1
+
+        if self.journal is not None:
+            self.journal.compact(self)
 
     def remove_edge_repeats(self):
-        ...
+        """
+        Merges edges with the same parent, child and type into the first of them, adding their weights together. Repeats
+        are found by hashing in a single pass.
+        """
+
+        self._run_operation()
+
+        kept_edges = {}
+        added_weights = {}
+        repeats = {}
+        for edge in self.edges:
+            parent_node = edge.parent_node()
+            child_node = edge.child_node()
+            if parent_node is None or child_node is None:
+                continue
+            kept_edge = kept_edges.setdefault((parent_node.uid, child_node.uid, edge.edge_type), edge)
+            if kept_edge is not edge:
+                added_weights[kept_edge.uid] = added_weights.get(kept_edge.uid, 0) + edge.edge_weight
+                repeats[edge.uid] = edge
+        if not repeats:
+            return
+
+        # Kept edges may be shared with another version, so are changed through copies.
+        _, owned_edges = self._own_elements(edges=[edge for edge in kept_edges.values() if edge.uid in added_weights])
+        for uid, added_weight in added_weights.items():
+            owned_edges[uid].edge_weight += added_weight
+
+        self._own_lists()
+        self._unlink_edges(list(repeats.values()))
+        self.edges[:] = [edge for edge in self.edges if edge.uid not in repeats]
+        self._track_edges(removed_uids=set(repeats))
+        self.structure_version += 1
+
+        if self.journal is not None:
+            self.journal.compact(self)
 
-    def decompose_nodes(self):
+    def reassign_repeated_identifiers(self):
+        """
+        Gives new id numbers (and so identifiers) to nodes whose identifier is already used by an earlier node, e.g.
+        inferred entities numbered independently in two merged graphs.
+        """
+
+        identifiers = set()
+        new_identifiers = {}
+        for node in self.nodes:
+            identifier = node.identifier
+            while identifier in identifiers:
+                if node.document_name == "Inferred":
+                    id_n = self.inferred_entity_count
+                    self.inferred_entity_count += 1
+                else:
+                    self.levels_tally[node.level] += 1
+                    id_n = self.levels_tally[node.level]
+                identifier = f"{node.document_name}-{node.level}:{id_n}"
+                new_identifiers[node.uid] = (id_n, identifier)
+            identifiers.add(identifier)
+
+        if new_identifiers:
+            # The nodes may be shared with another version, so are changed through copies.
+            owned_nodes, _ = self._own_elements(nodes=[node for node in self.nodes if node.uid in new_identifiers])
+            for uid, (id_n, identifier) in new_identifiers.items():
+                owned_nodes[uid].id_n = id_n
+                owned_nodes[uid].identifier = identifier
+            self.node_index = {node.identifier: node for node in self.nodes}
+            # Later records name nodes by their new identifiers, so the journal restarts from a snapshot.
+            if self.journal is not None:
+                self.journal.compact(self)
+
+    def decompose_nodes(self) -> (int, int):
         """
         Goes through all nodes in graph, splitting these where possible into smaller nodes (only one level smaller).
         Deletes the original nodes.
+
+        :return: Number of nodes decomposed, and number of nodes they were decomposed into.
         """
         self._run_operation()
 
@@ -449,29 +1463,61 @@ class KnowledgeGraph(Graph):
         to_delete = []
         all_new_nodes = []
         all_new_edges = []
-        for i, node in enumerate(self.nodes):
+        # Original node uid -> its first and last new nodes.
+        replacements = {}
+        for node in self.nodes:
             existing_nodes_at_level = self.levels_tally[node.level + 1]
 
-            new_nodes, new_edges = node.decompose(existing_nodes_at_level=existing_nodes_at_level)
+            new_nodes, new_edges = node.decompose(existing_nodes_at_level=existing_nodes_at_level,
+                                                  edges=self.node_edges(node))
 
             if len(new_nodes) > 1:
                 deleted_nodes_count += 1
                 new_nodes_count += len(new_nodes)
-                to_delete.append(i)
+                to_delete.append(node)
                 all_new_nodes += new_nodes
                 all_new_edges += new_edges
+                replacements[node.uid] = (new_nodes[0], new_nodes[-1])
 
                 # Update levels tally
                 self.levels_tally[node.level] -= 1
                 self.levels_tally[node.level + 1] += len(new_nodes)
 
-        for i in reversed(to_delete):
-            self.delete_node(self.nodes[i].identifier)
-
-        self.nodes += all_new_nodes
-        self.edges += all_new_edges
-
-        # TODO: Remember to update the content store.
+        # New edges to a neighbour that was itself decomposed are moved onto its new nodes. Both neighbours create the
+        # edge between them, so only one copy is kept.
+        kept_edges = []
+        replaced_edges = []
+        moved_edge_keys = set()
+        for edge in all_new_edges:
+            parent_node = edge.parent_node()
+            child_node = edge.child_node()
+            if parent_node.uid not in replacements and child_node.uid not in replacements:
+                kept_edges.append(edge)
+                continue
+            replaced_edges.append(edge)
+            parent_node = replacements[parent_node.uid][1] if parent_node.uid in replacements else parent_node
+            child_node = replacements[child_node.uid][0] if child_node.uid in replacements else child_node
+            key = (parent_node.uid, child_node.uid, edge.edge_type)
+            if key not in moved_edge_keys:
+                moved_edge_keys.add(key)
+                kept_edges.append(self._new_edge(parent_node, child_node, edge.edge_type, edge.edge_weight))
+
+        for edge in kept_edges:
+            edge.parent_node().add_edge(edge)
+            edge.child_node().add_edge(edge)
+        # Replaced edges were never registered with object nodes, but columnar ones are recorded in the store.
+        if self.store is not None and not self.shares_elements:
+            for edge in replaced_edges:
+                edge.delete_edge()
+
+        self._delete_nodes(to_delete)
+        for node in to_delete:
+            self._journal({"op": "delete_node", "identifier": node.identifier})
+
+        self.add_nodes(all_new_nodes)
+        self.add_edges(kept_edges)
+
+        return deleted_nodes_count, new_nodes_count
 
     def recompose_nodes(self):
         """
@@ -1,15 +1,23 @@
-import copy
 import cProfile
+import itertools
 import os
 import pstats
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+import numpy as np
 
-from KnowledgeGraph.edges import Edge
 from KnowledgeGraph.graph import KnowledgeGraph
+from KnowledgeGraph.document_tables import build_document_tables
 
 from Webscraper.wikipedia_scraper import WikipediaScraper
+from Webscraper.page_cache import PageCache
 
 from Utilitites.csv_operations import save_graph_to_csv, load_graph_elements_from_csv
-from Utilitites.json_operations import load_json_entity
+from Utilitites.binary_operations import save_graph_to_binary, load_graph_elements_from_binary
+from Utilitites.embedding_cache import EmbeddingCache
+from Utilitites.journal_operations import GraphJournal
+from Utilitites.json_operations import load_json_entity, iterate_json_entities
 
 
 class GraphManager:
@@ -22,7 +30,13 @@ class GraphManager:
     # TODO: To add in the ability to run things concurrently e.g. display graphs while also having entity linkage
     #  happening in the background.
 
-    def __init__(self, profile: bool):
+    def __init__(self, profile: bool, offline: bool = False, page_cache_ttl: float = None):
+        """
+        :param profile: Whether to profile operations, displayed on close.
+        :param offline: If True, web pages are only read from the page cache, never downloaded.
+        :param page_cache_ttl: Seconds after which cached web pages are downloaded again. None means never.
+        """
+
         self.profile = profile
         if self.profile:
             self.profiler = cProfile.Profile()
@@ -31,6 +45,11 @@ class GraphManager:
         self.graphs = {}
         self._build_directories()
 
+        # Persistent embedding caches, shared by all graphs using the same language model.
+        self.embedding_caches = {}
+        # Persistent cache of downloaded web pages, shared by all scrapers.
+        self.page_cache = PageCache(ttl=page_cache_ttl, offline=offline)
+
         print("Graph Manager created")
 
     @staticmethod
@@ -43,25 +62,115 @@ class GraphManager:
             os.mkdir("Data/Entities")
         if not os.path.isdir("Data/PDFs"):
             os.mkdir("Data/PDFs")
+        if not os.path.isdir("Data/Embedding-Cache"):
+            os.mkdir("Data/Embedding-Cache")
+        if not os.path.isdir("Data/Page-Cache"):
+            os.mkdir("Data/Page-Cache")
         if not os.path.isdir("Data/Entities/Saved-Graphs"):
             os.mkdir("Data/Entities/Saved-Graphs")
         if not os.path.isdir("Data/Entities/Saved-Graphs/CSV"):
             os.mkdir("Data/Entities/Saved-Graphs/CSV")
+        if not os.path.isdir("Data/Saved-Graphs"):
+            os.mkdir("Data/Saved-Graphs")
+        if not os.path.isdir("Data/Saved-Graphs/CSV"):
+            os.mkdir("Data/Saved-Graphs/CSV")
+        if not os.path.isdir("Data/Saved-Graphs/Binary"):
+            os.mkdir("Data/Saved-Graphs/Binary")
+        if not os.path.isdir("Data/Journals"):
+            os.mkdir("Data/Journals")
 
         print("Data directories initialised")
 
-    def save_graph(self, graph_name: str):
+    def save_graph(self, graph_name: str, file_format: str = "csv"):
         """
-        Save specified graph to CSV encoding.
+        Save specified graph to the given encoding.
 
         :param graph_name:
+        :param file_format: Options: csv, binary (columnar .npy files, which can be loaded memory mapped).
         """
 
-        # TODO: Build capability to save in other formats.
-        save_graph_to_csv(self.graphs[graph_name], graph_name)
+        if file_format == "csv":
+            save_graph_to_csv(self.graphs[graph_name], graph_name)
+        elif file_format == "binary":
+            save_graph_to_binary(self.graphs[graph_name], graph_name)
+        else:
+            raise Exception("Invalid file format given.")
 
         print("Graph saved")
 
+    def load_graph_binary(self, graph_name: str, file_name: str, memory_map: bool = True):
+        """
+        Loads a full graph from a binary-encoded graph to a new KnowledgeGraph object.
+
+        :param graph_name: Name to which the loaded KnowledgeGraph is assigned
+        :param file_name: Name the graph was saved under.
+        :param memory_map: If True, the saved columns are memory mapped rather than read into memory up front.
+        """
+
+        graph_nodes, graph_edges, strings, metadata = load_graph_elements_from_binary(file_name, memory_map=memory_map)
+        self._create_graph_from_metadata(graph_name, metadata)
+        self._build_graph_from_binary(self.graphs[graph_name], graph_nodes, graph_edges, strings, metadata)
+
+        print("Graph loaded from binary")
+
+    def _create_graph_from_metadata(self, graph_name: str, metadata: dict):
+        """Creates an empty graph with the storage engine and language model recorded in saved graph metadata."""
+
+        self.create_graph(graph_name=graph_name, spacy_model_name=metadata.get("spacy_model_name", "en_core_web_md"),
+                          storage=metadata.get("storage", "objects"))
+
+    @staticmethod
+    def _build_graph_from_binary(new_graph: KnowledgeGraph, graph_nodes: dict, graph_edges: dict, strings: list[str],
+                                 metadata: dict):
+        """Fills an empty graph with the columns loaded by load_graph_elements_from_binary."""
+
+        strings = np.array(strings, dtype=object)
+        identifiers = np.asarray(graph_nodes["identifier"])
+
+        # Creating nodes
+        nodes = new_graph.import_nodes(levels=graph_nodes["level"], document_names=strings[graph_nodes["document"]],
+                                       contents=strings[graph_nodes["content"]], id_ns=graph_nodes["id_n"],
+                                       identifiers=np.where(identifiers >= 0, strings[identifiers], None))
+
+        if "embedding" in graph_nodes:
+            embeddings = np.asarray(graph_nodes["embedding"])
+            for row in np.flatnonzero(graph_nodes["has_embedding"]):
+                nodes[row].embedding = embeddings[row]
+
+        # Creating Edges
+        new_graph.import_edges(sources=graph_edges["parent"], targets=graph_edges["child"],
+                               edge_types=strings[graph_edges["type"]], edge_weights=graph_edges["weight"], nodes=nodes)
+
+        new_graph.documents_used = metadata["documents_used"]
+        new_graph.levels_tally = metadata["levels_tally"]
+        new_graph.inferred_entity_count = metadata["inferred_entity_count"]
+        new_graph.embedding_projection = metadata["embedding_projection"]
+
+    def recover_graph(self, graph_name: str):
+        """
+        Recovers a graph that maintained a journal (e.g. after a crash) from its latest snapshot and the journal records
+        made since. The recovered graph carries on maintaining the journal.
+
+        :param graph_name: Name of the journaled graph, to which the recovered KnowledgeGraph is assigned.
+        """
+
+        snapshot_directory = GraphJournal.snapshot_directory(graph_name)
+        if snapshot_directory is None:
+            raise Exception(f"No journal snapshot exists for graph {graph_name}")
+        _, records = GraphJournal.read(graph_name)
+
+        graph_nodes, graph_edges, strings, metadata = load_graph_elements_from_binary(
+            os.path.basename(snapshot_directory), directory=os.path.dirname(snapshot_directory), memory_map=False)
+        self._create_graph_from_metadata(graph_name, metadata)
+        new_graph = self.graphs[graph_name]
+        self._build_graph_from_binary(new_graph, graph_nodes, graph_edges, strings, metadata)
+
+        for record in records:
+            new_graph.apply_journal_record(record)
+        new_graph.maintain_format("journal")
+
+        print(f"Graph {graph_name} recovered from journal ({len(records)} operations replayed)")
+
     def load_graph_csv(self, graph_name: str, file_name: str):
         """
         Loads a full graph from CSV-encoded graph to a KnowledgeGraph object.
@@ -75,48 +184,22 @@ class GraphManager:
         new_graph = self.graphs[graph_name]
 
         # Creating nodes
-        node_contents = graph_nodes.content
-        node_id_ns = graph_nodes.id_n
-        node_levels = graph_nodes.level
-        node_identifiers = graph_nodes.node_identifier
-        node_documents = graph_nodes.document
-
-        for node_identifier, node_level, node_id_n, node_content, node_document in zip(node_identifiers, node_levels,
-                                                                                       node_id_ns, node_contents,
-                                                                                       node_documents):
-            new_node = new_graph.create_node(level=node_level, document_name=node_document, content=node_content)
-            new_node.id_n = node_id_n
-            new_node.identifier = node_identifier
-
-        # Creating Edges
-        edge_identifiers = graph_edges.edge_identifier
-        edge_types = graph_edges.edge_type
-        edge_weights = graph_edges.edge_weight
-        edge_sources = graph_edges.source
-        edge_targets = graph_edges.target
-
-        for edge_identifier, edge_type, edge_weight, edge_source, edge_target in zip(edge_identifiers, edge_types,
-                                                                                     edge_weights, edge_sources,
-                                                                                     edge_targets):
-            try:
-                parent_node = new_graph.return_node(edge_source)
-            except Exception:
-                raise Exception("Necessary node has not been created from CSV loading")
-
-            try:
-                child_node = new_graph.return_node(edge_target)
-            except Exception:
-                raise Exception("Necessary node has not been created from CSV loading")
-
-            new_edge = Edge(parent=parent_node, child=child_node, edge_type=edge_type, edge_weight=edge_weight)
-            new_graph.edges.append(new_edge)
-
-            parent_node.add_edge(new_edge)
-            child_node.add_edge(new_edge)
+        new_graph.import_nodes(levels=graph_nodes.level.to_numpy(), document_names=graph_nodes.document.tolist(),
+                               contents=graph_nodes.content.tolist(), id_ns=graph_nodes.id_n.to_numpy(),
+                               identifiers=graph_nodes.node_identifier.tolist())
+
+        # Creating Edges, with their source and target identifiers resolved against the created nodes in one join.
+        try:
+            new_graph.import_edges(sources=graph_edges.source.to_numpy(), targets=graph_edges.target.to_numpy(),
+                                   edge_types=graph_edges.edge_type.tolist(),
+                                   edge_weights=graph_edges.edge_weight.to_numpy())
+        except Exception:
+            raise Exception("Necessary node has not been created from CSV loading")
 
         print("Graph loaded from CSV")
 
-    def build_graph_from_wikipedia_url(self, graph_name: str, url: str, degree: int):
+    def build_graph_from_wikipedia_url(self, graph_name: str, url: str, degree: int, max_workers: int = 8,
+                                       requests_per_second: float = 10):
         """
         Given the URL to a wikipedia page, creates a graph using that page and any pages that are linked within the
         specified number of degrees.
@@ -125,15 +208,19 @@ class GraphManager:
         :param url: Wikipedia URL
         :param degree: The degree of separation with the original article to be included. 0 would only use the original
         page.
+        :param max_workers: Maximum number of linked pages downloaded at once.
+        :param requests_per_second: Maximum requests per second sent to Wikipedia.
         """
 
         # Create a wikipedia scraper
-        wiki_scraper = WikipediaScraper(starting_url=url)
+        wiki_scraper = WikipediaScraper(starting_url=url, max_workers=max_workers,
+                                        requests_per_second=requests_per_second, page_cache=self.page_cache)
 
         # Creates json for the original page combined with all articles with separation within degrees. Also keeps
         # track of links between original and others.
         document, links, original_article_name = wiki_scraper.create_wiki_json_from_article_links(url=url, degree=degree)
-        self.save_json([document], links, f"{original_page_title}-{degree}")
+        self.page_cache.flush()
+        wiki_scraper.save_json(document, links, f"{original_article_name}-{degree}")
 
         # Load the json of the documents and their links.
         documents = load_json_entity(f"{original_article_name}-{degree}.json")
@@ -147,7 +234,7 @@ class GraphManager:
         num_linked_documents = len(documents.keys())
         print(f"Found {num_linked_documents} Within-Degree Pages")
 
-        for i, doc_name in documents.keys():
+        for doc_name in documents.keys():
             specified_document = {doc_name: documents[doc_name]}
             self.graphs[graph_name].add_document_to_graph(specified_document, document_name=doc_name)
 
@@ -162,16 +249,14 @@ class GraphManager:
                     for p, para in enumerate(across_document_links[key_1][key_2][key_3]):
                         # Find the parent node (the node in the original document)
                         original_document_content = documents[key_1][key_2][key_3][p]
-                        parent_node_index = self.graphs[graph_name].node_content.index(original_document_content)
-                        parent_node = self.graphs[graph_name].nodes[parent_node_index]
+                        parent_node = self.graphs[graph_name].return_node_by_content(original_document_content)
 
                         for linked_document in para:
                             # TODO: Build a method to find the ID of a point in a document, use to set the IDs, as well
                             #  as to provide a means of accessing them more easily.
 
                             # Find the child node (the linked document)
-                            child_node_index = self.graphs[graph_name].node_content.index(linked_document)
-                            child_node = self.graphs[graph_name].nodes[child_node_index]
+                            child_node = self.graphs[graph_name].return_node_by_content(linked_document)
 
                             # Create link with contents
                             self.graphs[graph_name].create_edge(parent_node=parent_node, child_node=child_node,
@@ -180,13 +265,17 @@ class GraphManager:
         # TODO: Get all links in between pages already existing
         print(f"Graph {graph_name} created from Wikipedia URL")
 
-    def create_graph(self, graph_name: str):
+    def create_graph(self, graph_name: str, spacy_model_name: str = "en_core_web_md", storage: str = "objects",
+                     maintained_formats: list[str] = None):
         """
         Instantiates a KnowledgeGraph and assigns it to graph_name in the self.graphs dict.
 
         Gives an option for overwriting an existing KnowledgeGraph already assigned to graph_name.
 
         :param graph_name:
+        :param spacy_model_name: Spacy model used to embed the graph, loaded once per process when first needed.
+        :param storage: Storage engine for the graph's nodes and edges. Options: objects, columnar.
+        :param maintained_formats: Formats the graph is autosaved to as it is built. Options: journal.
         """
 
         if graph_name in self.graphs.keys():
@@ -197,7 +286,9 @@ class GraphManager:
             else:
                 print("Graph not created or overwritten.")
                 return
-        self.graphs[graph_name] = KnowledgeGraph(graph_name)
+        self.graphs[graph_name] = KnowledgeGraph(graph_name, spacy_model_name=spacy_model_name, storage=storage)
+        for file_format in maintained_formats or []:
+            self.graphs[graph_name].maintain_format(file_format)
 
         print(f"Created new graph: {graph_name}")
 
@@ -214,7 +305,100 @@ class GraphManager:
 
         print(f"Added JSON {json_file_name} to graph {graph_name}")
 
-    def run_routine_graph_computations(self, graph_name: str):
+    def add_documents_to_graph(self, graph_name: str, documents: dict, processes: int = None):
+        """
+        Adds many json-encoded documents to a graph, building each document's nodes and edges in a pool of worker
+        processes and merging them into the graph in the order given.
+
+        :param graph_name:
+        :param documents: Document name -> structured document in json format.
+        :param processes: Number of worker processes. Defaults to the number of CPUs.
+        """
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            added_documents = self._add_documents_with_executor(self.graphs[graph_name], list(documents.items()),
+                                                                executor)
+
+        print(f"Added {len(added_documents)} documents to graph {graph_name}")
+
+    @staticmethod
+    def _add_documents_with_executor(graph: KnowledgeGraph, documents: list[tuple[str, dict]], executor: Executor,
+                                     chunk_size: int = 8) -> list[str]:
+        """
+        Builds the node and edge tables of documents with an executor, then merges them into a graph.
+
+        :return: Names of the documents added (those not already in the graph).
+        """
+
+        document_names = []
+        datas = []
+        for document_name, data in documents:
+            if document_name in graph.documents_used or document_name in document_names:
+                print(f"Document {document_name} already in graph {graph.graph_name}, skipping")
+                continue
+            document_names.append(document_name)
+            datas.append(data)
+
+        tables = executor.map(build_document_tables, datas, chunksize=chunk_size)
+        for document_name, (nodes, edges) in zip(document_names, tables):
+            graph.add_document_tables(document_name, nodes, edges)
+        return document_names
+
+    def ingest_json_entities(self, graph_name: str, source: str = "Data/Entities", batch_size: int = 100,
+                             processes: int = 1):
+        """
+        Streams a directory (or glob) of json-encoded documents into a graph, in batches.
+
+        Documents are read one at a time, and the edges of each batch are built once all its nodes have been added, so
+        at most a batch of documents is held in memory. Throughput is printed for each batch.
+
+        :param graph_name:
+        :param source: A directory of json files, or a glob pattern matching them.
+        :param batch_size: Number of documents added per batch.
+        :param processes: Number of worker processes building the documents of each batch. 1 builds them in this
+        process.
+        """
+
+        graph = self.graphs[graph_name]
+        documents = iterate_json_entities(source)
+        executor = ProcessPoolExecutor(max_workers=processes) if processes > 1 else None
+
+        total_documents = 0
+        for batch_number in itertools.count(1):
+            start_time = time.perf_counter()
+            start_nodes, start_edges = len(graph.nodes), len(graph.edges)
+
+            batch = list(itertools.islice(documents, batch_size))
+            if not batch:
+                break
+
+            if executor is not None:
+                added_documents = self._add_documents_with_executor(graph, batch, executor)
+            else:
+                added_documents = []
+                for json_file_name, data in batch:
+                    if json_file_name in graph.documents_used:
+                        print(f"Document {json_file_name} already in graph {graph_name}, skipping")
+                        continue
+                    graph.add_document_to_graph(data, json_file_name, build_edges=False)
+                    added_documents.append(json_file_name)
+
+                for document_name in added_documents:
+                    graph.create_document_edges(document_name)
+            del batch
+
+            batch_time = time.perf_counter() - start_time
+            total_documents += len(added_documents)
+            print(f"Batch {batch_number}: added {len(added_documents)} documents ({len(graph.nodes) - start_nodes} "
+                  f"nodes, {len(graph.edges) - start_edges} edges) in {batch_time:.2f}s, "
+                  f"{len(added_documents) / max(batch_time, 1e-9):.1f} documents/s")
+
+        if executor is not None:
+            executor.shutdown()
+        print(f"Ingested {total_documents} documents from {source} to graph {graph_name}")
+
+    def run_routine_graph_computations(self, graph_name: str, embedding_batch_size: int = 256,
+                                       embedding_processes: int = 1, refit_embedding_projection: bool = False):
         """
         Run all the routine operations of the graph:
         1. Create links between entities in the graph.
@@ -223,10 +407,25 @@ class GraphManager:
         Intended for when all the desired elements have been added to the graph.
 
         :param graph_name:
+        :param embedding_batch_size: Number of nodes embedded per spacy batch.
+        :param embedding_processes: Number of processes used to embed nodes.
+        :param refit_embedding_projection: If True, the embedding projection is fitted again from all nodes, rather than
+        only projecting nodes added since it was fitted.
         """
 
+        graph = self.graphs[graph_name]
+
         # self.graphs[graph_name].harvest_entity_links()
-        self.graphs[graph_name].compute_node_embeddings()
+        if graph.spacy_model_name not in self.embedding_caches:
+            self.embedding_caches[graph.spacy_model_name] = EmbeddingCache(model_name=graph.spacy_model_name)
+        def report_progress(num_embedded: int, num_to_embed: int):
+            print(f"Embedded {num_embedded}/{num_to_embed} node contents")
+
+        num_embedded, num_cached, embedding_time = graph.compute_node_embeddings(
+            batch_size=embedding_batch_size, n_process=embedding_processes,
+            embedding_cache=self.embedding_caches[graph.spacy_model_name], refit=refit_embedding_projection,
+            progress_callback=report_progress)
+        print(f"Embedded {num_embedded} node contents ({num_cached} cached) in {embedding_time:.2f}s")
         print(f"Node embeddings computed for graph {graph_name}")
 
     def add_website_to_graph(self, graph_name: str, url: str):
@@ -239,7 +438,7 @@ class GraphManager:
         """
 
         # Save a website (assumed to be wikipedia) to json.  TODO: In future, build handling for other types of urls.
-        wiki_scraper = WikipediaScraper(starting_url=url)
+        wiki_scraper = WikipediaScraper(starting_url=url, page_cache=self.page_cache)
         page_name = wiki_scraper.get_wiki_page_name(url=url)
         wiki_scraper.create_wiki_json_from_original_url()
 
@@ -252,23 +451,56 @@ class GraphManager:
         Provided the names of two instantiated graphs, combines them into a new graph (without deleting them) and
         removes any node/edge repeats.
 
+        The combined graph holds copies of the nodes and edges, so the original graphs are left unchanged, and uses the
+        storage engine and spacy model of the first graph. Nodes of one graph with the same document, level and content
+        as nodes of the other are merged, as are edges with the same parent, child and type (adding their weights), and
+        nodes left with an identifier already in use are given a new one.
+
         :param graph_1_name:
         :param graph_2_name:
         :param combined_graph_name:
         """
 
-        # Create new combined graph
-        self.create_graph(graph_name=combined_graph_name)
-
-        # Add all nodes and edges to graph.
-        self.graphs[combined_graph_name].nodes += self.graphs[graph_1_name].nodes + \
-                                                  self.graphs[graph_2_name].nodes
-        self.graphs[combined_graph_name].edges += self.graphs[graph_1_name].edges + \
-                                                  self.graphs[graph_2_name].edges
-        # TODO: Check if I need to do a deep copy
+        graph_1 = self.graphs[graph_1_name]
+        graph_2 = self.graphs[graph_2_name]
 
-        print(f"Merged graphs {graph_1_name} and {graph_2_name} to {combined_graph_name}")
-        # TODO: Build in checking for node repeats and remove but keep all unique edges.
+        # Create new combined graph
+        self.create_graph(graph_name=combined_graph_name, spacy_model_name=graph_1.spacy_model_name,
+                          storage=graph_1.storage)
+        combined_graph = self.graphs[combined_graph_name]
+
+        # Copy all nodes and edges to the graph.
+        nodes = graph_1.nodes + graph_2.nodes
+        new_nodes = combined_graph.import_nodes(levels=[node.level for node in nodes],
+                                                document_names=[node.document_name for node in nodes],
+                                                contents=[node.content for node in nodes],
+                                                id_ns=[node.id_n for node in nodes],
+                                                identifiers=[node.identifier for node in nodes])
+        for node, new_node in zip(nodes, new_nodes):
+            if len(node.embedding) > 0:
+                new_node.embedding = node.embedding
+
+        node_positions = {node.uid: i for i, node in enumerate(nodes)}
+        edges = [edge for edge in graph_1.edges + graph_2.edges if edge.parent_node() is not None and
+                 edge.child_node() is not None and edge.parent_node().uid in node_positions and
+                 edge.child_node().uid in node_positions]
+        combined_graph.import_edges(sources=[node_positions[edge.parent_node().uid] for edge in edges],
+                                    targets=[node_positions[edge.child_node().uid] for edge in edges],
+                                    edge_types=[edge.edge_type for edge in edges],
+                                    edge_weights=[edge.edge_weight for edge in edges], nodes=new_nodes)
+
+        combined_graph.documents_used = list(dict.fromkeys(graph_1.documents_used + graph_2.documents_used))
+        combined_graph.levels_tally = [max(tally_1, tally_2) for tally_1, tally_2 in zip(graph_1.levels_tally,
+                                                                                        graph_2.levels_tally)]
+        combined_graph.inferred_entity_count = max(graph_1.inferred_entity_count, graph_2.inferred_entity_count)
+
+        # Remove repeats
+        combined_graph.remove_node_repeats(sources=[1] * len(graph_1.nodes) + [2] * len(graph_2.nodes))
+        combined_graph.remove_edge_repeats()
+        combined_graph.reassign_repeated_identifiers()
+
+        print(f"Merged graphs {graph_1_name} and {graph_2_name} to {combined_graph_name} ({len(nodes)} nodes merged to "
+              f"{len(combined_graph.nodes)}, {len(edges)} edges merged to {len(combined_graph.edges)})")
 
     def split_graphs(self):
         """
@@ -328,17 +560,28 @@ class GraphManager:
             else:
                 new_graph_name = graph_name + "-1"
 
-            self.graphs[new_graph_name] = copy.copy(self.graphs[graph_name])
-            self.graphs[new_graph_name].decompose_nodes()
+            # The new version shares the unchanged nodes and edges with the original, which is left as it was.
+            self.graphs[new_graph_name] = self.graphs[graph_name].snapshot(new_graph_name)
+            deleted_nodes_count, new_nodes_count = self.graphs[new_graph_name].decompose_nodes()
+            print(f"Decomposed {deleted_nodes_count} nodes into {new_nodes_count} nodes")
             self.graphs[new_graph_name].remove_invalid_edges_and_nodes()
         else:
             raise Exception(f"Graph {graph_name} is not decomposable")
 
     def close(self):
         """
-        Closes the graph manager and displays profiler output.
+        Closes the graph manager, writing out the embedding caches, page cache and graph journals, and displays profiler
+        output.
         """
 
+        for graph in self.graphs.values():
+            if graph.journal is not None:
+                graph.journal.close()
+
+        for embedding_cache in self.embedding_caches.values():
+            embedding_cache.flush()
+        self.page_cache.close()
+
         if self.profile:
             ps = pstats.Stats(self.profiler)
             ps.sort_stats("tottime")
@@ -0,0 +1,103 @@
+class IndexOverlay(dict):
+    """
+    A graph index holding only the entries one version of a graph has changed, over a base index shared with the other
+    versions (see KnowledgeGraph.snapshot). The base is never changed once shared: lookups of keys this version has not
+    changed fall through to it, and removed keys are recorded rather than deleted from it. Lists held by the base must
+    be copied into the overlay (see own) before this version changes them.
+
+    Keys held by the overlay itself are found at the speed of a plain dict.
+    """
+
+    __slots__ = ("base", "removed")
+
+    def __init__(self, base: dict):
+        super().__init__()
+        self.base = base
+        self.removed = set()
+
+    @classmethod
+    def over(cls, index: dict) -> "IndexOverlay":
+        """
+        Creates an overlay to share an index between versions, reusing the base of an overlay with no changes of its own
+        rather than stacking another layer on top of it.
+
+        :param index: The index to share, which must no longer be changed.
+        :return: The new overlay.
+        """
+
+        if isinstance(index, IndexOverlay) and not dict.__len__(index) and not index.removed:
+            index = index.base
+        return cls(index)
+
+    def __missing__(self, key):
+        if key in self.removed:
+            raise KeyError(key)
+        return self.base[key]
+
+    def __contains__(self, key) -> bool:
+        return dict.__contains__(self, key) or (key not in self.removed and key in self.base)
+
+    def get(self, key, default=None):
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        if key in self.removed:
+            return default
+        return self.base.get(key, default)
+
+    def __setitem__(self, key, value):
+        self.removed.discard(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        dict.pop(self, key, None)
+        if key in self.base:
+            self.removed.add(key)
+
+    def pop(self, key, *default):
+        if key not in self:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        value = self[key]
+        del self[key]
+        return value
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def own(self, keys):
+        """
+        Copies the lists held by the base at the given keys into the overlay, so that this version can change them in
+        place.
+
+        :param keys: Keys of the lists about to be changed.
+        """
+
+        for key in keys:
+            if not dict.__contains__(self, key) and key not in self.removed:
+                nodes = self.base.get(key)
+                if nodes is not None:
+                    dict.__setitem__(self, key, list(nodes))
+
+    def __iter__(self):
+        yield from dict.__iter__(self)
+        for key in self.base:
+            if key not in self.removed and not dict.__contains__(self, key):
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def keys(self) -> list:
+        return list(self)
+
+    def values(self) -> list:
+        return [self[key] for key in self]
+
+    def items(self) -> list:
+        return [(key, self[key]) for key in self]
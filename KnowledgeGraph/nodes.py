@@ -1,46 +1,32 @@
+import itertools
+import sys
 import weakref
+from abc import ABC, abstractmethod
 
 
 from KnowledgeGraph.edges import Edge
 
 
-class Node:
+class BaseNode(ABC):
 
-    """Basic Node class."""
+    """
+    Behaviour shared by all nodes, whatever stores their attributes. Carries no attributes itself, so storage engines
+    can give their nodes only the slots they need.
+    """
 
-    def __init__(self, level: int, id_n: int, document_name: str, content: str):
-        self.identifier = f"{document_name}-{level}:{id_n}"
-        self.id_n = id_n
-        self.level = level
-        self.content = content
-        self.document_name = document_name
+    __slots__ = ()
 
-        self.edges = []
-        self.embedding = []
-
-        self.individual_words = [word.lower().replace(".", "") for word in content.split(" ")]
+    @property
+    def individual_words(self) -> list[str]:
+        """Lower case words of the content, without full stops."""
 
-        # For decompositions
-        self.splits_into = len(content.split(". "))
+        return [word.lower().replace(".", "") for word in self.content.split(" ")]
 
-    def add_edge(self, edge: Edge):
-        """
-        Adds a weakref to the edges attribute to the specified edge.
+    @property
+    def splits_into(self) -> int:
+        """Number of sentences the node would split into on decomposition."""
 
-        :param edge: The edge to add to the attribute.
-        """
-        self.edges.append(weakref.ref(edge))
-
-    def remove_edge(self, edge_to_remove: Edge):
-        """
-        Removes an edge from the edges attribute.
-
-        :param edge_to_remove:
-        :return:
-        """
-        edge_ids = [edge().identifier for edge in self.edges]
-        edge_to_remove_index = edge_ids.index(edge_to_remove.identifier)
-        del self.edges[edge_to_remove_index]
+        return self.content.count(". ") + 1
 
     def get_child_edges(self) -> list[Edge]:
         """
@@ -60,83 +46,162 @@ class Node:
 
         return [edge() for edge in self.edges if edge().child_node is self]
 
-    def compute_individual_word_indices(self):
-        ...
+    @abstractmethod
+    def _new_node(self, level: int, id_n: int, document_name: str, content: str) -> "BaseNode":
+        """Creates a node of the same storage kind as this one."""
 
-    def remove_incomplete_edges(self):
-        """
-        Removes all edges from edges attribute that dont point to an existing Edge object (i.e. that edge has since
-        been deleted).
-        """
-
-        to_remove = []
+    @abstractmethod
+    def _new_edge(self, parent: "BaseNode", child: "BaseNode", edge_type: str) -> Edge:
+        """Creates an edge of the same storage kind as this node."""
 
-        for i, edge in enumerate(self.edges):
-            if edge() is None:
-                print("Edge no longer exists, deleting")
-                to_remove.append(i)
-        for i in reversed(to_remove):
-            del self.edges[i]
+    def compute_individual_word_indices(self):
+        ...
 
-    def decompose(self, existing_nodes_at_level: int) -> (list, list[Edge]):
+    def decompose(self, existing_nodes_at_level: int, edges: list[Edge] = None) -> (list, list[Edge]):
         """
         Creates nodes out of sentences within this node (if possible). Preserves all structural edges identically.
         Creates new flow edges to reflect the splitting.
         Preserves inferred edges for points where the inferred entity exists within new node only.
 
         :param existing_nodes_at_level: Number of nodes that exist at the new level (for node identifier assignment).
+        :param edges: This node's edges in the graph being decomposed. Defaults to all its live edges.
         :return: List of new nodes, list of new edges.
         """
 
+        if edges is None:
+            edges = [edge() for edge in self.edges if edge() is not None]
+
         # TODO: Compartmentalise this class
         if self.splits_into > 1:
             new_edges = []
             new_nodes = []
 
             # Isolate this instance's structural edges
-            structural_edges = [edge for edge in self.edges if edge().edge_type == "Structural"]
-            flow_edges = [edge for edge in self.edges if edge().edge_type == "Flow"]
-            inferred_edges = [edge for edge in self.edges if edge().edge_type[:7] == "Keyword"]
+            structural_edges = [edge for edge in edges if edge.edge_type == "Structural"]
+            flow_edges = [edge for edge in edges if edge.edge_type == "Flow"]
+            inferred_edges = [edge for edge in edges if edge.edge_type[:7] == "Keyword"]
 
             components = self.content.split(". ")
 
             for i in range(self.splits_into):
-                new_node = Node(level=self.level + 1, id_n=existing_nodes_at_level+i+1, document_name=self.document_name,
-                                content=components[i])
+                new_node = self._new_node(level=self.level + 1, id_n=existing_nodes_at_level+i+1,
+                                          document_name=self.document_name, content=components[i])
                 new_nodes.append(new_node)
 
                 # Add structural edges
                 for s_edge in structural_edges:
-                    new_structural_edge = Edge(parent=s_edge().parent_node(), child=new_node, edge_type="Structural")
+                    new_structural_edge = self._new_edge(parent=s_edge.parent_node(), child=new_node,
+                                                         edge_type="Structural")
                     new_edges.append(new_structural_edge)
 
-            input_flow_edge = [edge for edge in flow_edges if edge().child_node() is self][0]
-            output_flow_edge = [edge for edge in flow_edges if edge().parent_node() is self][0]
+            # The first and last nodes of a document have no incoming and outgoing flow edge respectively.
+            input_flow_edge = next((edge for edge in flow_edges if edge.child_node() == self), None)
+            output_flow_edge = next((edge for edge in flow_edges if edge.parent_node() == self), None)
 
             for i, node in enumerate(new_nodes):
                 if i == 0:
                     # The first node inherits the flow edge to the original node
-                    new_flow_edge = Edge(parent=input_flow_edge().parent_node(), child=node, edge_type="Flow")
-                elif i == self.splits_into - 1:
-                    # The last node inherits the outgoing flow edge in addition to the edge in between the last one.
-                    new_flow_edge = Edge(parent=new_nodes[i-1], child=node, edge_type="Flow")
-                    new_edges.append(new_flow_edge)
-                    new_flow_edge = Edge(parent=node, child=output_flow_edge().child_node(), edge_type="Flow")
+                    if input_flow_edge is not None:
+                        new_edges.append(self._new_edge(parent=input_flow_edge.parent_node(), child=node,
+                                                        edge_type="Flow"))
                 else:
                     # Other Nodes get edges in between them.
-                    new_flow_edge = Edge(parent=new_nodes[i-1], child=node, edge_type="Flow")
-                new_edges.append(new_flow_edge)
+                    new_edges.append(self._new_edge(parent=new_nodes[i-1], child=node, edge_type="Flow"))
+                if i == self.splits_into - 1 and output_flow_edge is not None:
+                    # The last node inherits the outgoing flow edge.
+                    new_edges.append(self._new_edge(parent=node, child=output_flow_edge.child_node(), edge_type="Flow"))
 
             # Inferred entity edges
             for edge in inferred_edges:
                 # Find which of the newly created nodes contains the specified entity
                 inferred_entity_node = edge.parent_node()
                 inferred_entity_content = inferred_entity_node.content
-                relevant_nodes = [node for node in new_nodes if inferred_entity in node.individual_words]
+                relevant_nodes = [node for node in new_nodes if inferred_entity_content in node.individual_words]
                 for node in relevant_nodes:
-                    new_inferred_edge = Edge(parent=inferred_entity_node, child=node, edge_type=f"Inferred-{inferred_entity_content}")
+                    new_inferred_edge = self._new_edge(parent=inferred_entity_node, child=node,
+                                                       edge_type=edge.edge_type)
                     new_edges.append(new_inferred_edge)
 
             return new_nodes, new_edges
         else:
-            return [self], self.edges
+            return [self], edges
+
+
+class Node(BaseNode):
+
+    """Basic Node class."""
+
+    __slots__ = ("uid", "id_n", "level", "content", "document_name", "edges", "embedding", "_identifier", "__weakref__")
+
+    _uids = itertools.count()
+
+    def __init__(self, level: int, id_n: int, document_name: str, content: str):
+        self.uid = next(Node._uids)
+        self.id_n = id_n
+        self.level = level
+        self.content = content
+        self.document_name = sys.intern(document_name)
+
+        self.edges = []
+        self.embedding = []
+
+        # Rendered from the document name, level and id_n on first access, unless set explicitly.
+        self._identifier = None
+
+    @property
+    def identifier(self) -> str:
+        if self._identifier is None:
+            self._identifier = f"{self.document_name}-{self.level}:{self.id_n}"
+        return self._identifier
+
+    @identifier.setter
+    def identifier(self, identifier: str):
+        self._identifier = identifier
+
+    def add_edge(self, edge: Edge):
+        """
+        Adds a weakref to the edges attribute to the specified edge.
+
+        :param edge: The edge to add to the attribute.
+        """
+        self.edges.append(weakref.ref(edge))
+
+    def remove_edge(self, edge_to_remove: Edge):
+        """
+        Removes an edge from the edges attribute.
+
+        :param edge_to_remove:
+        :return:
+        """
+        for i, edge in enumerate(self.edges):
+            if edge() is edge_to_remove:
+                del self.edges[i]
+                return
+        raise Exception("Edge is not attached to this node")
+
+    def remove_edges(self, edge_uids: set[int]):
+        """
+        Removes many edges from the edges attribute in a single pass, along with any that no longer exist.
+
+        :param edge_uids: Uids of the edges to remove.
+        """
+
+        self.edges[:] = [edge for edge in self.edges if edge() is not None and edge().uid not in edge_uids]
+
+    def _new_node(self, level: int, id_n: int, document_name: str, content: str) -> "Node":
+        """Creates a node of the same storage kind as this one."""
+
+        return Node(level=level, id_n=id_n, document_name=document_name, content=content)
+
+    def _new_edge(self, parent: "Node", child: "Node", edge_type: str) -> Edge:
+        """Creates an edge of the same storage kind as this node."""
+
+        return Edge(parent=parent, child=child, edge_type=edge_type)
+
+    def remove_incomplete_edges(self):
+        """
+        Removes all edges from edges attribute that dont point to an existing Edge object (i.e. that edge has since
+        been deleted).
+        """
+
+        self.edges[:] = [edge for edge in self.edges if edge() is not None]
@@ -0,0 +1,39 @@
+import threading
+
+
+# Process-wide registry of loaded spacy models, shared by every graph.
+_loaded_models = {}
+_model_load_options = {}
+_registry_lock = threading.Lock()
+
+
+def configure_spacy_model(model_name: str, **load_options):
+    """
+    Sets the keyword arguments passed to spacy.load for a model, e.g. exclude=["parser"]. Must be called before the
+    model is first used.
+
+    :param model_name: Name of the spacy model.
+    :param load_options: Keyword arguments for spacy.load.
+    """
+
+    with _registry_lock:
+        if model_name in _loaded_models:
+            raise Exception(f"Spacy model {model_name} has already been loaded")
+        _model_load_options[model_name] = load_options
+
+
+def get_spacy_model(model_name: str = "en_core_web_md"):
+    """
+    Returns the shared instance of a spacy model, loading it on first use.
+
+    :param model_name: Name of the spacy model.
+    :return: The loaded spacy Language object.
+    """
+
+    if model_name not in _loaded_models:
+        with _registry_lock:
+            if model_name not in _loaded_models:
+                # Imported here as importing spacy alone takes seconds.
+                import spacy
+                _loaded_models[model_name] = spacy.load(model_name, **_model_load_options.get(model_name, {}))
+    return _loaded_models[model_name]
@@ -0,0 +1,160 @@
+import json
+import os
+import pickle
+
+import numpy as np
+
+from KnowledgeGraph.graph_precursor import Graph
+
+
+BINARY_FORMAT_VERSION = 2
+# Version 1 only saved embeddings when every node had one, and did not record the storage engine or language model.
+READABLE_FORMAT_VERSIONS = [1, 2]
+
+
+def _save_string_table(strings: list[str], directory: str):
+    """Saves strings as one utf-8 byte array plus the offset of each string within it."""
+
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    np.save(f"{directory}/strings_offsets.npy", offsets)
+    np.save(f"{directory}/strings_data.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+
+def _load_string_table(directory: str) -> list[str]:
+    offsets = np.load(f"{directory}/strings_offsets.npy")
+    data = np.load(f"{directory}/strings_data.npy").tobytes()
+    return [data[start:end].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def save_graph_to_binary(graph: Graph, file_name: str, directory: str = "Data/Saved-Graphs/Binary"):   # TODO: Do typing but avoid recursive imports
+    """
+    Provided a KnowledgeGraph instance, saves it as a directory of .npy column files to allow full recovery.
+
+    Nodes are rows (edges refer to them by row index), and content, document names, edge types and non-default node
+    identifiers are held once in a string table. Embeddings are saved for the nodes that have one, with a mask of which
+    rows hold an embedding, along with the fitted embedding projection.
+
+    :param graph: A KnowledgeGraph instance.
+    :param file_name: Name of the directory the graph is saved to.
+    :param directory: Directory holding saved binary graphs.
+    """
+
+    graph_directory = f"{directory}/{file_name}"
+    if not os.path.isdir(graph_directory):
+        os.makedirs(graph_directory)
+
+    strings = {}
+
+    def encode(string: str) -> int:
+        return strings.setdefault(string, len(strings))
+
+    num_nodes = len(graph.nodes)
+    node_rows = {node.uid: row for row, node in enumerate(graph.nodes)}
+    node_level = np.zeros(num_nodes, dtype=np.int8)
+    node_id_n = np.zeros(num_nodes, dtype=np.int64)
+    node_document = np.zeros(num_nodes, dtype=np.int32)
+    node_content = np.zeros(num_nodes, dtype=np.int32)
+    # -1 where the identifier is the default rendering of document, level and id_n.
+    node_identifier = np.full(num_nodes, -1, dtype=np.int32)
+    for row, node in enumerate(graph.nodes):
+        node_level[row] = node.level
+        node_id_n[row] = node.id_n
+        node_document[row] = encode(node.document_name)
+        node_content[row] = encode(node.content)
+        if node.identifier != f"{node.document_name}-{node.level}:{node.id_n}":
+            node_identifier[row] = encode(node.identifier)
+
+    # Edges to nodes outside the graph are not saved.
+    edges = [edge for edge in graph.edges if edge.parent_node() is not None and edge.child_node() is not None and
+             edge.parent_node().uid in node_rows and edge.child_node().uid in node_rows]
+    edge_parent = np.array([node_rows[edge.parent_node().uid] for edge in edges], dtype=np.int32)
+    edge_child = np.array([node_rows[edge.child_node().uid] for edge in edges], dtype=np.int32)
+    edge_type = np.array([encode(edge.edge_type) for edge in edges], dtype=np.int32)
+    edge_weight = np.array([edge.edge_weight for edge in edges], dtype=np.int32)
+
+    np.save(f"{graph_directory}/nodes_level.npy", node_level)
+    np.save(f"{graph_directory}/nodes_id_n.npy", node_id_n)
+    np.save(f"{graph_directory}/nodes_document.npy", node_document)
+    np.save(f"{graph_directory}/nodes_content.npy", node_content)
+    np.save(f"{graph_directory}/nodes_identifier.npy", node_identifier)
+    np.save(f"{graph_directory}/edges_parent.npy", edge_parent)
+    np.save(f"{graph_directory}/edges_child.npy", edge_child)
+    np.save(f"{graph_directory}/edges_type.npy", edge_type)
+    np.save(f"{graph_directory}/edges_weight.npy", edge_weight)
+    _save_string_table(list(strings), graph_directory)
+
+    embeddings = [node.embedding for node in graph.nodes]
+    embedding_mask = np.array([len(embedding) > 0 for embedding in embeddings], dtype=bool)
+    has_embeddings = bool(embedding_mask.any())
+    if has_embeddings:
+        node_embeddings = np.zeros((num_nodes, len(embeddings[int(np.argmax(embedding_mask))])), dtype=np.float32)
+        for row in np.flatnonzero(embedding_mask):
+            node_embeddings[row] = embeddings[row]
+        np.save(f"{graph_directory}/embeddings.npy", node_embeddings)
+        np.save(f"{graph_directory}/embeddings_mask.npy", embedding_mask)
+    else:
+        for file_name in ["embeddings.npy", "embeddings_mask.npy"]:
+            if os.path.isfile(f"{graph_directory}/{file_name}"):
+                os.remove(f"{graph_directory}/{file_name}")
+
+    has_embedding_projection = graph.embedding_projection is not None
+    if has_embedding_projection:
+        with open(f"{graph_directory}/embedding_projection.pkl", "wb") as file:
+            pickle.dump(graph.embedding_projection, file)
+    elif os.path.isfile(f"{graph_directory}/embedding_projection.pkl"):
+        os.remove(f"{graph_directory}/embedding_projection.pkl")
+
+    metadata = {
+        "format_version": BINARY_FORMAT_VERSION,
+        "graph_name": graph.graph_name,
+        "storage": graph.storage,
+        "spacy_model_name": graph.spacy_model_name,
+        "documents_used": graph.documents_used,
+        "levels_tally": graph.levels_tally,
+        "inferred_entity_count": graph.inferred_entity_count,
+        "has_embeddings": has_embeddings,
+        "has_embedding_projection": has_embedding_projection,
+    }
+    with open(f"{graph_directory}/metadata.json", "w") as file:
+        json.dump(metadata, file)
+
+
+def load_graph_elements_from_binary(file_name: str, directory: str = "Data/Saved-Graphs/Binary",
+                                    memory_map: bool = True) -> (dict, dict, list[str], dict):
+    """
+    Loads the columns of a graph saved with save_graph_to_binary.
+
+    :param file_name: Name of the directory the graph was saved to.
+    :param directory: Directory holding saved binary graphs.
+    :param memory_map: If True, the column files are memory mapped rather than read into memory.
+    :return: Node columns, edge columns (each a dict of arrays, embeddings and their mask included with the nodes if
+    saved), the string table and the graph metadata (including the embedding projection, if saved).
+    """
+
+    graph_directory = f"{directory}/{file_name}"
+    mmap_mode = "r" if memory_map else None
+
+    with open(f"{graph_directory}/metadata.json", "r") as file:
+        metadata = json.load(file)
+    if metadata["format_version"] not in READABLE_FORMAT_VERSIONS:
+        raise Exception(f"Unsupported binary graph format version {metadata['format_version']}")
+
+    nodes = {column: np.load(f"{graph_directory}/nodes_{column}.npy", mmap_mode=mmap_mode)
+             for column in ["level", "id_n", "document", "content", "identifier"]}
+    if metadata["has_embeddings"]:
+        nodes["embedding"] = np.load(f"{graph_directory}/embeddings.npy", mmap_mode=mmap_mode)
+        if os.path.isfile(f"{graph_directory}/embeddings_mask.npy"):
+            nodes["has_embedding"] = np.load(f"{graph_directory}/embeddings_mask.npy")
+        else:
+            nodes["has_embedding"] = np.ones(len(nodes["embedding"]), dtype=bool)
+    metadata["embedding_projection"] = None
+    if metadata.get("has_embedding_projection"):
+        with open(f"{graph_directory}/embedding_projection.pkl", "rb") as file:
+            metadata["embedding_projection"] = pickle.load(file)
+    edges = {column: np.load(f"{graph_directory}/edges_{column}.npy", mmap_mode=mmap_mode)
+             for column in ["parent", "child", "type", "weight"]}
+    strings = _load_string_table(graph_directory)
+
+    return nodes, edges, strings, metadata
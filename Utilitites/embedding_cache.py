@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    On-disk cache of content embeddings for a single language model.
+
+    Vectors are stored in a memory-mapped .npy array, with a json index mapping a hash of the model name and content to
+    a row of that array. The array starts small and doubles in capacity as it fills, up to the size limit. Once it is
+    at the limit and full, the least recently used entry is evicted and its row reused.
+    """
+
+    def __init__(self, model_name: str, cache_directory: str = "Data/Embedding-Cache", max_size: int = 128 * 2 ** 20,
+                 initial_entries: int = 1024):
+        """
+        :param model_name: Name of the language model the embeddings come from.
+        :param cache_directory: Directory holding the caches of all models.
+        :param max_size: Maximum size of the vectors array in bytes.
+        :param initial_entries: Number of rows the vectors array is created with.
+        """
+
+        self.model_name = model_name
+        self.max_size = max_size
+        self.initial_entries = initial_entries
+
+        # Models can be loaded from a path, so the name is made safe for use in file names.
+        file_name = re.sub(r"[^\w.-]", "_", model_name)
+        self.vectors_path = f"{cache_directory}/{file_name}-vectors.npy"
+        self.index_path = f"{cache_directory}/{file_name}-index.json"
+
+        # Content key -> row in the vectors array, ordered from least to most recently used.
+        self.index = OrderedDict()
+        self.free_rows = []
+        self.vectors = None
+
+        if not os.path.isdir(cache_directory):
+            os.makedirs(cache_directory)
+
+        if os.path.isfile(self.index_path) and os.path.isfile(self.vectors_path):
+            with open(self.index_path, "r") as file:
+                saved_index = json.load(file)
+            self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+            capacity, dimensions = self.vectors.shape
+            if capacity <= self._max_entries(dimensions):
+                self.index = OrderedDict(saved_index["entries"])
+                used_rows = set(self.index.values())
+                self.free_rows = [row for row in reversed(range(capacity)) if row not in used_rows]
+            else:
+                # Size limit lowered below the saved array, start again rather than remapping rows.
+                self.vectors = None
+
+    def _key(self, content: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\0{content}".encode("utf-8")).hexdigest()
+
+    def _max_entries(self, dimensions: int) -> int:
+        return max(1, self.max_size // (dimensions * np.dtype(np.float32).itemsize))
+
+    def _allocate_vectors(self, dimensions: int):
+        """Creates the memory-mapped vectors array, discarding any existing entries."""
+
+        capacity = min(self.initial_entries, self._max_entries(dimensions))
+        self.vectors = np.lib.format.open_memmap(self.vectors_path, mode="w+", dtype=np.float32,
+                                                 shape=(capacity, dimensions))
+        self.index = OrderedDict()
+        self.free_rows = list(reversed(range(capacity)))
+
+    def _grow_vectors(self):
+        """Doubles the capacity of the vectors array (up to the size limit), keeping existing rows in place."""
+
+        capacity, dimensions = self.vectors.shape
+        new_capacity = min(2 * capacity, self._max_entries(dimensions))
+        new_path = f"{self.vectors_path}.new"
+        new_vectors = np.lib.format.open_memmap(new_path, mode="w+", dtype=np.float32,
+                                                shape=(new_capacity, dimensions))
+        new_vectors[:capacity] = self.vectors
+        new_vectors.flush()
+        del new_vectors
+        self.vectors = None
+        os.replace(new_path, self.vectors_path)
+        self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+        self.free_rows.extend(reversed(range(capacity, new_capacity)))
+
+    def get(self, contents: list[str]) -> list:
+        """
+        Looks up the cached embedding of each content.
+
+        :param contents: Contents to look up.
+        :return: The cached vector for each content, or None where the content has not been cached.
+        """
+
+        found = []
+        for content in contents:
+            key = self._key(content)
+            row = self.index.get(key)
+            if row is None or self.vectors is None:
+                found.append(None)
+            else:
+                self.index.move_to_end(key)
+                found.append(np.array(self.vectors[row]))
+        return found
+
+    def put(self, contents: list[str], vectors: list):
+        """
+        Adds embeddings to the cache, growing it or (at the size limit) evicting the least recently used entries if it
+        is full.
+
+        :param contents: Contents that were embedded.
+        :param vectors: The embedding of each content.
+        """
+
+        for content, vector in zip(contents, vectors):
+            if self.vectors is None or self.vectors.shape[1] != len(vector):
+                self._allocate_vectors(len(vector))
+
+            key = self._key(content)
+            if key in self.index:
+                row = self.index[key]
+                self.index.move_to_end(key)
+            else:
+                if not self.free_rows and self.vectors.shape[0] < self._max_entries(self.vectors.shape[1]):
+                    self._grow_vectors()
+                if self.free_rows:
+                    row = self.free_rows.pop()
+                else:
+                    _, row = self.index.popitem(last=False)
+                self.index[key] = row
+            self.vectors[row] = vector
+
+    def flush(self):
+        """Writes the vectors and index to disk."""
+
+        if self.vectors is None:
+            return
+        self.vectors.flush()
+        with open(self.index_path, "w") as file:
+            json.dump({"model_name": self.model_name, "entries": list(self.index.items())}, file)
@@ -0,0 +1,149 @@
+import json
+import os
+import shutil
+import time
+
+from KnowledgeGraph.graph_precursor import Graph
+from Utilitites.binary_operations import save_graph_to_binary
+
+
+class GraphJournal:
+    """
+    Append-only journal of the mutations made to a graph, allowing it to be recovered after a crash.
+
+    Records are json lines with increasing sequence numbers, written through a buffered file that is fsynced after a
+    number of records or a period of time. Once enough records have built up, the journal is compacted: the whole graph
+    is saved as a binary snapshot (noting the last sequence number it includes) and the journal is emptied.
+    """
+
+    def __init__(self, graph_name: str, directory: str = "Data/Journals", fsync_every: int = 1000,
+                 fsync_interval: float = 1, compaction_threshold: int = 100000):
+        """
+        :param graph_name:
+        :param directory: Directory holding the journals of all graphs.
+        :param fsync_every: Number of records after which the journal is fsynced.
+        :param fsync_interval: Seconds after which any unsynced records are fsynced (checked on each operation).
+        :param compaction_threshold: Number of records after which the journal is compacted into a snapshot.
+        """
+
+        self.directory = f"{directory}/{graph_name}"
+        self.journal_path = f"{self.directory}/journal.jsonl"
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compaction_threshold = compaction_threshold
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        snapshot_sequence, records = self.read(graph_name, directory)
+        self.sequence = snapshot_sequence
+        for record in records:
+            self.sequence = max(self.sequence, record["sequence"])
+
+        self.file = open(self.journal_path, "a")
+        self.records_since_sync = 0
+        self.records_since_snapshot = 0
+        self.last_sync_time = time.monotonic()
+
+    def append(self, record: dict):
+        """
+        Appends a mutation record to the journal.
+
+        :param record: json-serialisable description of the mutation, including an "op" key.
+        """
+
+        self.sequence += 1
+        record["sequence"] = self.sequence
+        self.file.write(json.dumps(record) + "\n")
+
+        self.records_since_sync += 1
+        self.records_since_snapshot += 1
+        if self.records_since_sync >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        """Flushes buffered records and fsyncs them to disk."""
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.records_since_sync = 0
+        self.last_sync_time = time.monotonic()
+
+    def sync_if_due(self):
+        """Fsyncs the journal if unsynced records are older than the fsync interval."""
+
+        if self.records_since_sync and time.monotonic() - self.last_sync_time >= self.fsync_interval:
+            self.sync()
+
+    def needs_compaction(self) -> bool:
+        return self.records_since_snapshot >= self.compaction_threshold
+
+    def compact(self, graph: Graph):   # TODO: Do typing but avoid recursive imports
+        """
+        Saves a full snapshot of the graph and empties the journal.
+
+        :param graph: The KnowledgeGraph the journal belongs to, in the state reached by the last record.
+        """
+
+        self.sync()
+
+        new_snapshot = f"{self.directory}/snapshot-new"
+        if os.path.isdir(new_snapshot):
+            shutil.rmtree(new_snapshot)
+        save_graph_to_binary(graph, "snapshot-new", directory=self.directory)
+        with open(f"{new_snapshot}/journal.json", "w") as file:
+            json.dump({"last_sequence": self.sequence}, file)
+
+        # The snapshot records its last sequence number, so a crash at any point here cannot replay records twice.
+        if os.path.isdir(f"{self.directory}/snapshot"):
+            shutil.rmtree(f"{self.directory}/snapshot")
+        os.rename(new_snapshot, f"{self.directory}/snapshot")
+
+        self.file.close()
+        self.file = open(self.journal_path, "w")
+        self.records_since_snapshot = 0
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+    @staticmethod
+    def snapshot_directory(graph_name: str, directory: str = "Data/Journals") -> str | None:
+        """Returns the directory of the latest complete snapshot of a graph, or None if there is none."""
+
+        for snapshot in ["snapshot", "snapshot-new"]:
+            snapshot_directory = f"{directory}/{graph_name}/{snapshot}"
+            if os.path.isfile(f"{snapshot_directory}/journal.json"):
+                return snapshot_directory
+        return None
+
+    @staticmethod
+    def read(graph_name: str, directory: str = "Data/Journals") -> (int, list[dict]):
+        """
+        Reads the journal of a graph.
+
+        :param graph_name:
+        :param directory: Directory holding the journals of all graphs.
+        :return: The last sequence number included in the snapshot (0 if there is none), and the journal records after
+        it. A partially written final record is ignored.
+        """
+
+        snapshot_sequence = 0
+        snapshot_directory = GraphJournal.snapshot_directory(graph_name, directory)
+        if snapshot_directory is not None:
+            with open(f"{snapshot_directory}/journal.json", "r") as file:
+                snapshot_sequence = json.load(file)["last_sequence"]
+
+        records = []
+        journal_path = f"{directory}/{graph_name}/journal.jsonl"
+        if os.path.isfile(journal_path):
+            with open(journal_path, "r") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    if record["sequence"] > snapshot_sequence:
+                        records.append(record)
+
+        return snapshot_sequence, records
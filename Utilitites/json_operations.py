@@ -1,4 +1,7 @@
+import glob
 import json
+import os
+from typing import Iterator
 
 
 def load_json_entity(file_name: str) -> dict | list:
@@ -15,6 +18,25 @@ def load_json_entity(file_name: str) -> dict | list:
     return data
 
 
+def iterate_json_entities(source: str = "Data/Entities") -> Iterator[tuple[str, dict | list]]:
+    """
+    Lazily loads json entity documents one at a time, so only the document in use is held in memory.
+
+    Link files saved alongside scraped documents (ending _links.json) are skipped.
+
+    :param source: A directory of json files, or a glob pattern matching them.
+    :return: Generator of the file name and loaded json of each document, in file name order.
+    """
+
+    pattern = f"{source}/*.json" if os.path.isdir(source) else source
+    for path in sorted(glob.glob(pattern)):
+        if path.endswith("_links.json"):
+            continue
+        with open(path, "r") as file:
+            data = json.load(file)
+        yield os.path.basename(path), data
+
+
 def load_json_graph(file_name: str):
     ...
 
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, quote, unquote
+
+
+class PageNotCachedError(Exception):
+    """Raised when a page is requested in offline mode but has not been cached."""
+
+
+class PageCache:
+    """
+    On-disk cache of fetched pages, keyed by a hash of the canonical URL.
+
+    Each page is stored as its own file under the cache directory, with a json index recording its URL, size and when
+    it was fetched and last used. Entries older than the TTL are treated as missing, and the least recently used entries
+    are evicted once the total size exceeds the limit. In offline mode pages are only ever served from the cache, stale
+    or not, so a cached crawl can be replayed exactly.
+
+    The index is kept in memory in order of use, and written to disk after a number of changes and on flush or close.
+    Pages cached since the last write are not found after a crash, and are fetched again.
+    """
+
+    def __init__(self, cache_directory: str = "Data/Page-Cache", ttl: float = None, max_bytes: int = 2 ** 30,
+                 offline: bool = False, flush_every: int = 100):
+        """
+        :param cache_directory: Directory holding the cached pages and index.
+        :param ttl: Seconds after which a cached page is fetched again. None means pages never expire.
+        :param max_bytes: Maximum total size of the cached pages.
+        :param offline: If True, pages are only served from the cache.
+        :param flush_every: Number of changes to the index (pages added or used) after which it is written to disk.
+        """
+
+        self.cache_directory = cache_directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.flush_every = flush_every
+
+        self.index_path = f"{cache_directory}/index.json"
+        self.lock = threading.Lock()
+
+        if not os.path.isdir(cache_directory):
+            os.makedirs(cache_directory)
+
+        # Key -> entry, ordered from least to most recently used.
+        self.index = OrderedDict()
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, "r") as file:
+                saved_index = json.load(file)
+            for key in sorted(saved_index, key=lambda k: saved_index[k]["last_used"]):
+                self.index[key] = saved_index[key]
+        self.unsaved_changes = 0
+        self.total_bytes = sum(entry["size"] for entry in self.index.values())
+
+    @staticmethod
+    def canonical_url(url: str) -> str:
+        """
+        Reduces a URL to the form used as the cache key: no scheme or fragment, lower case host and consistently
+        percent-encoded path.
+        """
+
+        parts = urlsplit(url if "://" in url else "http://" + url)
+        path = quote(unquote(parts.path), safe="/:@!$&'()*+,;=-._~")
+        canonical = parts.netloc.lower() + path
+        if parts.query:
+            canonical += "?" + parts.query
+        return canonical
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(self.canonical_url(url).encode("utf-8")).hexdigest()
+
+    def _page_path(self, key: str) -> str:
+        return f"{self.cache_directory}/{key}.html"
+
+    def _changed(self):
+        """Records a change to the index, writing it out if enough have built up. The lock must be held."""
+
+        self.unsaved_changes += 1
+        if self.unsaved_changes >= self.flush_every:
+            self._save_index()
+
+    def _save_index(self):
+        """Writes the index to disk, replacing the old one in a single step. The lock must be held."""
+
+        with open(f"{self.index_path}.new", "w") as file:
+            json.dump(self.index, file)
+        os.replace(f"{self.index_path}.new", self.index_path)
+        self.unsaved_changes = 0
+
+    def flush(self):
+        """Writes the index to disk if it has changed since it was last written."""
+
+        with self.lock:
+            if self.unsaved_changes:
+                self._save_index()
+
+    def close(self):
+        self.flush()
+
+    def get(self, url: str) -> bytes | None:
+        """
+        Returns a cached page.
+
+        :param url:
+        :return: The page content, or None if it is not cached or has expired (outside of offline mode).
+        """
+
+        key = self._key(url)
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            if not self.offline and self.ttl is not None and time.time() - entry["fetched_at"] > self.ttl:
+                return None
+            entry["last_used"] = time.time()
+            self.index.move_to_end(key)
+            self._changed()
+
+        try:
+            with open(self._page_path(key), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            with self.lock:
+                self._remove(key)
+                self._changed()
+            return None
+
+    def put(self, url: str, content: bytes):
+        """
+        Adds a page to the cache, evicting the least recently used pages if the cache is over its size limit.
+
+        :param url:
+        :param content: The page content.
+        """
+
+        key = self._key(url)
+        with open(self._page_path(key), "wb") as file:
+            file.write(content)
+
+        with self.lock:
+            if key in self.index:
+                self.total_bytes -= self.index[key]["size"]
+            now = time.time()
+            self.index[key] = {"url": url, "size": len(content), "fetched_at": now, "last_used": now}
+            self.index.move_to_end(key)
+            self.total_bytes += len(content)
+
+            # The new page is last in the index, so is never evicted to make room for itself.
+            while self.total_bytes > self.max_bytes and len(self.index) > 1:
+                self._remove(next(iter(self.index)))
+            self._changed()
+
+    def _remove(self, key: str):
+        """Removes an entry and its page file. The lock must be held."""
+
+        entry = self.index.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry["size"]
+        if os.path.isfile(self._page_path(key)):
+            os.remove(self._page_path(key))
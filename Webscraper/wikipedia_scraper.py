@@ -1,58 +1,139 @@
+import html
 import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
 import bs4
-from bs4 import BeautifulSoup as bs
+from bs4 import BeautifulSoup as bs, SoupStrainer
+from bs4.builder import builder_registry
 
 
-from Utilitites.flatten_dict_to_list import flatten_document_to_list_elements
+from Webscraper.page_cache import PageCache, PageNotCachedError
 
 
 import numpy as np
 
 
+TITLE_PATTERN = re.compile(rb"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+
+
+class HostRateLimiter:
+    """Spaces out requests to each host so that no host receives more than a set number of requests per second."""
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.next_request_time = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url: str):
+        """Blocks until a request to the host of url is allowed."""
+
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            request_time = max(now, self.next_request_time.get(host, now))
+            self.next_request_time[host] = request_time + self.interval
+        if request_time > now:
+            time.sleep(request_time - now)
+
+
 class WikipediaScraper:
 
-    def __init__(self, starting_url: str):
+    def __init__(self, starting_url: str, max_workers: int = 8, requests_per_second: float = 10,
+                 timeout: float = 10, wiki_host: str = "en.wikipedia.org", scheme: str = "http",
+                 page_cache: PageCache = None, parse_mode: str = "content", parser: str = None):
+        """
+        :param starting_url: Wikipedia URL to start from.
+        :param max_workers: Maximum number of pages fetched at once.
+        :param requests_per_second: Maximum requests per second sent to any one host.
+        :param timeout: Seconds to wait for a page before giving up.
+        :param wiki_host: Host serving the wiki pages, which can be replaced by a local stand-in server.
+        :param scheme: Scheme used for the links found in pages.
+        :param page_cache: Optional on-disk cache that pages are read from before going to the network.
+        :param parse_mode: Options: content (only parse the page title and article body), full (parse the whole page).
+        :param parser: BeautifulSoup parser backend. If None, lxml is used when installed, otherwise html.parser.
+        """
+
+        self.wiki_host = wiki_host
+        self.scheme = scheme
+
         if self.check_url_is_wikipedia(starting_url):
             self.starting_url = starting_url
         else:
             print("Error, incorrect URL provided")
 
-        self.known_motifs = ["[edit]", "\n"] + \
-                            [f"[{num}]" for num in range(500)]
+        # Literal motifs, plus citation markers of any number e.g. [12], removed in a single pass.
+        self.known_motifs = ["[edit]", "\n"]
+        self.motif_pattern = re.compile("|".join(re.escape(motif) for motif in self.known_motifs) + r"|\[\d+\]")
 
         self.enclosing_elements = ["h1", "h2", "h3"]
 
         self.enclosed_elements = ["p"]
 
+        # Elements holding the article title and body.
+        self.content_element_ids = ["firstHeading", "mw-content-text"]
+
         # For Link Mining
         self.unwanted_link_formats = [
             "_(disambiguation)",
-            "en.wikipedia.org/wiki/Main_Page",
-            "en.wikipedia.org/wiki/Wikipedia:",
-            "en.wikipedia.org/wiki/Special:",
-            "en.wikipedia.org/wiki/Portal:",
-            "en.wikipedia.org/wiki/Talk:",
-            "en.wikipedia.org/wiki/File:",
-            "en.wikipedia.org/wiki/Help:",
-            "en.wikipedia.org/wiki/ISBN_(identifier)",
-            "en.wikipedia.org/wiki/Doi_(identifier)"
+            f"{wiki_host}/wiki/Main_Page",
+            f"{wiki_host}/wiki/Wikipedia:",
+            f"{wiki_host}/wiki/Special:",
+            f"{wiki_host}/wiki/Portal:",
+            f"{wiki_host}/wiki/Talk:",
+            f"{wiki_host}/wiki/File:",
+            f"{wiki_host}/wiki/Help:",
+            f"{wiki_host}/wiki/ISBN_(identifier)",
+            f"{wiki_host}/wiki/Doi_(identifier)"
         ]
 
-    @staticmethod
-    def check_url_is_wikipedia(url: str) -> bool:
+        # For fetching pages: one pooled session shared by all workers.
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.page_cache = page_cache
+
+        # Pages fetched ahead of being parsed, by URL. Kept until the build that fetched them finishes, as a page can be
+        # linked (and so loaded) several times.
+        self.prefetched_pages = {}
+
+        # For parsing
+        if parse_mode == "content":
+            # Only the heading and article body are built into the soup, skipping navigation, footers etc.
+            self.parse_only = SoupStrainer(id=self.content_element_ids)
+        elif parse_mode == "full":
+            self.parse_only = None
+        else:
+            raise Exception("Invalid parse mode given.")
+        if parser is None:
+            parser = "lxml" if builder_registry.lookup("lxml") is not None else "html.parser"
+        self.parser = parser
+
+    def check_url_is_wikipedia(self, url: str) -> bool:
         """Checks if the URL is an English wikipedia page.
         I.e. if it includes en.wikipedia.org/wiki/
         Can change this in future to permit/refuse on different criteria.
         """
-        if "en.wikipedia.org/wiki/" in url:
+        if f"{self.wiki_host}/wiki/" in url:
             return True
         else:
             return False
 
     def get_wiki_page_name(self, url: str) -> str:
         soup, title = self.load_soup(url)
-        return soup.title.string
+        return title
 
     @staticmethod
     def check_href_is_wikipedia(href: str) -> bool:
@@ -65,17 +146,68 @@ class WikipediaScraper:
         else:
             return False
 
-    @staticmethod
-    def load_soup(url: str) -> (bs, str):
-        page = requests.get(url)
-        soup = bs(page.content, "html.parser")
-        title = soup.title.string
+    def fetch_page(self, url: str) -> bytes:
+        """
+        Returns a page from the page cache if possible, otherwise downloads it through the shared session, respecting
+        the per-host rate limit.
+        """
+
+        if self.page_cache is not None:
+            content = self.page_cache.get(url)
+            if content is not None:
+                return content
+            if self.page_cache.offline:
+                raise PageNotCachedError(f"Page {url} is not cached and the page cache is offline")
+
+        self.rate_limiter.wait(url)
+        page = self.session.get(url, timeout=self.timeout)
+        page.raise_for_status()
+
+        if self.page_cache is not None:
+            self.page_cache.put(url, page.content)
+        return page.content
+
+    def prefetch_pages(self, urls: list[str]):
+        """
+        Downloads pages concurrently, keeping them for load_soup until clear_prefetched_pages is called. Pages that fail
+        to download are left to be fetched again (and raise) when loaded.
+
+        :param urls: URLs of the pages, repeats are only fetched once.
+        """
+
+        to_fetch = [url for url in dict.fromkeys(urls) if url not in self.prefetched_pages]
+        if not to_fetch:
+            return
+
+        def fetch(url: str):
+            try:
+                return url, self.fetch_page(url)
+            except (requests.RequestException, PageNotCachedError):
+                return url, None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for url, content in executor.map(fetch, to_fetch):
+                if content is not None:
+                    self.prefetched_pages[url] = content
+
+    def clear_prefetched_pages(self):
+        self.prefetched_pages = {}
+
+    def load_soup(self, url: str) -> (bs, str):
+        content = self.prefetched_pages.get(url)
+        if content is None:
+            content = self.fetch_page(url)
+        soup = bs(content, self.parser, parse_only=self.parse_only)
+        if self.parse_only is None:
+            title = soup.title.string
+        else:
+            # The title element is not parsed, so is read from the raw page.
+            title_match = TITLE_PATTERN.search(content)
+            title = html.unescape(title_match.group(1).decode("utf-8", errors="replace")) if title_match else None
         return soup, title
 
     def remove_all_wikipedia_motifs(self, text: str) -> str:
-        for motif in self.known_motifs:
-            text = text.replace(motif, "")
-        return text
+        return self.motif_pattern.sub("", text)
 
     def identify_links(self, tag: bs4.element.Tag) -> list:
         """Given a tag, returns appropriate wikipedia links, excluding those of identified types."""
@@ -85,7 +217,7 @@ class WikipediaScraper:
             try:
                 href = link["href"]
                 if self.check_href_is_wikipedia(href):
-                    url = "en.wikipedia.org" + href
+                    url = self.wiki_host + href
                     if self.check_url_is_wikipedia(url):
                         remove = False
                         for unwanted in self.unwanted_link_formats:
@@ -93,7 +225,7 @@ class WikipediaScraper:
                                 remove = True
                                 break
                         if not remove:
-                            wiki_urls.append("http://" + url)
+                            wiki_urls.append(f"{self.scheme}://" + url)
             except KeyError:
                 pass
         # TODO: Remove normal wikipedia pages.
@@ -112,7 +244,7 @@ class WikipediaScraper:
         """
         Method to strip all the contents from the created soup.
 
-        1. Iterates over all the tags in the soup.
+        1. Iterates over all the enclosing and enclosed tags in the soup.
           - Identifies if the tag is one which encloses others (e.g. if its h1 or h2, its likely to enclose other parts
         of the document. If so it updates the current scope.
           - Identifies if the tag is one which is at the bottom of the enclosing hierarchy i.e. p.
@@ -128,7 +260,7 @@ class WikipediaScraper:
         wiki_contents = {}
         wiki_links = {}
 
-        for tag in soup.find_all():
+        for tag in soup.find_all(self.enclosing_elements + self.enclosed_elements):
             if tag.name in self.enclosing_elements:
                 # If the tag is of a specific type, e.g. h1 or h2, its likely to contain other tags, so we preserve this
                 #  structure by making a note of it.
@@ -176,16 +308,7 @@ class WikipediaScraper:
                             to_del.append(i)
                     for i in reversed(to_del):
                         del wiki_contents[key_1][key_2][key_3][-1-i]
-
-        # Do the same for links
-        for key_1 in wiki_links.keys():
-            for key_2 in wiki_links[key_1].keys():
-                for key_3 in wiki_links[key_1][key_2].keys():
-                    to_del = []
-                    for i, p in enumerate(reversed(wiki_links[key_1][key_2][key_3])):
-                        if p == "":
-                            to_del.append(i)
-                    for i in reversed(to_del):
+                        # Remove the links of the same paragraph, keeping links aligned with the paragraphs.
                         del wiki_links[key_1][key_2][key_3][-1-i]
 
         return wiki_contents, wiki_links
@@ -226,7 +349,12 @@ class WikipediaScraper:
             else:
                 # Check link is a wikipedia link
                 if self.check_url_is_wikipedia(l):
-                    doc, doc_links, doc_title = self._create_wiki_json(l)
+                    try:
+                        doc, doc_links, doc_title = self._create_wiki_json(l)
+                    except (requests.RequestException, PageNotCachedError) as error:
+                        # Skipped from both lists, keeping the names aligned with the documents.
+                        print(f"Skipping {l}: {error}")
+                        continue
                     links_documents.append(doc)
                     links_names.append(doc_title)
                 else:
@@ -313,7 +441,28 @@ class WikipediaScraper:
         compiled_documents_flattened = [c for ci in compiled_documents for c in ci]
         return compiled_documents_flattened
 
-    def create_wiki_json_from_article_links(self, url: str,  degree: int) -> (str, list, list):
+    def _link_urls(self, links: dict | list) -> list[str]:
+        """Returns every wikipedia URL within a nested links structure, in order of appearance."""
+
+        if type(links) is dict:
+            return [url for key in links.keys() for url in self._link_urls(links[key])]
+        elif type(links) is list:
+            return [url for l in links for url in self._link_urls(l)]
+        elif self.check_url_is_wikipedia(links):
+            return [links]
+        return []
+
+    def create_wiki_json_from_article_links(self, url: str,  degree: int, fan_out_caps: list[int] = None,
+                                            max_pages: int = None) -> (str, list, list):
+        """
+        Creates structural json documents for a page and the pages linked from it within the given degree of separation.
+
+        :param url: Wikipedia URL of the original page.
+        :param degree: Degree of separation from the original page to include.
+        :param fan_out_caps: For degree > 1, maximum number of new pages followed from each page, per degree.
+        :param max_pages: For degree > 1, maximum number of pages parsed in total.
+        :return: List of documents, links between them, and the original page title.
+        """
         document, links, original_page_title = self._create_wiki_json(url=url)
 
         if degree == 0:
@@ -321,8 +470,14 @@ class WikipediaScraper:
 
             return [document], links, original_page_title
         elif degree == 1:
+            # Fetch all the linked pages concurrently before they are parsed one by one.
+            self.prefetch_pages(self._link_urls(links))
+
             # Compile all the links to be mined. Meanwhile, make a note of all the links between them.
-            sub_documents, sub_names = self.build_from_document_links(links)
+            try:
+                sub_documents, sub_names = self.build_from_document_links(links)
+            finally:
+                self.clear_prefetched_pages()
 
             # Flatten all the jsons to a list - the links can be found from the names in the sub_names
             all_wikis = self._convert_nested_document_dict_to_unnested_list(nested_docs=sub_documents,
@@ -341,21 +496,81 @@ class WikipediaScraper:
             # self.create_wiki_json_from_link_compliation(links)   TODO: Work out if any of this is useful
             # Save all the wikis, then return a list of all the links between them.
         elif degree > 1:
-            # Flatten links from dict to list.
-            links_flattened = flatten_document_to_list_elements(links)
-
-            compiled_documents = [document]
-            compiled_links = [links]
+            return self._crawl_breadth_first(url, document, links, original_page_title, degree,
+                                             fan_out_caps=fan_out_caps, max_pages=max_pages)
 
-            # For link in list
-            for link in links_flattened:
-                # Call create_wiki recursively, somehow passing through information
-                new_wikis_dict, new_links, new_main_article_name = self.create_wiki_json_from_article_links(url=link,
-                                                                                                            degree=degree-1)  # TODO: NEED to pass through info and change the way it's saved.
-                compiled_documents += new_wikis_dict
-                compiled_links += new_links
+    def _crawl_breadth_first(self, url: str, document: dict, links: dict, original_page_title: str, degree: int,
+                             fan_out_caps: list[int] = None, max_pages: int = None) -> (list, dict, str):
+        """
+        Crawls the pages linked from an already parsed page breadth first, up to the given degree of separation. Each
+        page is fetched and parsed once, however many paths lead to it.
+
+        :param url: URL of the starting page.
+        :param document: Parsed starting page.
+        :param links: Links of the starting page.
+        :param original_page_title: Title of the starting page.
+        :param degree: Degree of separation from the starting page to crawl to.
+        :param fan_out_caps: Maximum number of new pages followed from each page, per degree (index 0 is the starting
+        page). None, or a missing entry, means no cap.
+        :param max_pages: Maximum number of pages parsed in total, including the starting page.
+        :return: List holding a dict of all pages by title, the links between crawled pages (by title, in the same
+        structure as the pages), and the starting page title.
+        """
 
-            return compiled_documents, compiled_links, original_page_title
+        documents = dict(document)
+        page_links = {original_page_title: links}
+        # Canonical URL -> title of the parsed page.
+        page_titles = {PageCache.canonical_url(url): original_page_title}
+        visited = {PageCache.canonical_url(url)}
+
+        frontier = [links]
+        for depth in range(degree):
+            fan_out_cap = fan_out_caps[depth] if fan_out_caps is not None and depth < len(fan_out_caps) else None
+
+            next_frontier = []
+            for frontier_links in frontier:
+                new_urls = []
+                for link in self._link_urls(frontier_links):
+                    if fan_out_cap is not None and len(new_urls) >= fan_out_cap:
+                        break
+                    canonical_link = PageCache.canonical_url(link)
+                    if canonical_link not in visited:
+                        visited.add(canonical_link)
+                        new_urls.append(link)
+                next_frontier += new_urls
+
+            if max_pages is not None:
+                next_frontier = next_frontier[:max(0, max_pages - len(page_titles))]
+            self.prefetch_pages(next_frontier)
+
+            frontier = []
+            for link in next_frontier:
+                try:
+                    new_document, new_links, title = self._create_wiki_json(link)
+                except (requests.RequestException, PageNotCachedError) as error:
+                    print(f"Skipping {link}: {error}")
+                    continue
+                documents.update(new_document)
+                page_links.setdefault(title, new_links)
+                page_titles[PageCache.canonical_url(link)] = title
+                frontier.append(new_links)
+            # Pages are only parsed in the degree they were first reached at.
+            self.clear_prefetched_pages()
+
+            print(f"Degree {depth + 1}: parsed {len(frontier)} new pages")
+
+        # Convert links to the titles of crawled pages, dropping links to pages outside the crawl.
+        def to_titles(nested_links):
+            if type(nested_links) is dict:
+                return {key: to_titles(nested_links[key]) for key in nested_links.keys()}
+            return [[page_titles[PageCache.canonical_url(link)] for link in paragraph_links
+                     if PageCache.canonical_url(link) in page_titles] for paragraph_links in nested_links]
+
+        linked_names = {}
+        for title_links in page_links.values():
+            linked_names.update(to_titles(title_links))
+
+        return [documents], linked_names, original_page_title
 
 if __name__ == "__main__":
     url1 = "https://en.wikipedia.org/wiki/Immanuel_Kant"
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import spacy
+
+from KnowledgeGraph.graph import KnowledgeGraph
+from Utilitites.embedding_cache import EmbeddingCache
+
+
+DOCUMENT = {"Kant": {"Life": {"None": ["Kant was born in Konigsberg", "Kant wrote on reason"]},
+                     "Work": {"None": ["The critique of reason", "Kant wrote on reason"]}}}
+
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.working_directory = tempfile.TemporaryDirectory()
+        self.cache_directory = f"{self.working_directory.name}/Embedding-Cache"
+
+        # A small model with random word vectors stands in for a full spacy model.
+        model = spacy.blank("en")
+        rng = np.random.default_rng(0)
+        for word in "Kant Life Work was born in Konigsberg wrote on reason The critique of".split():
+            model.vocab.set_vector(word, rng.normal(size=16).astype(np.float32))
+        self.model_path = f"{self.working_directory.name}/model"
+        model.to_disk(self.model_path)
+
+    def tearDown(self):
+        self.working_directory.cleanup()
+
+    def embed(self, embedding_cache: EmbeddingCache = None) -> (np.ndarray, int, int):
+        graph = KnowledgeGraph("Embedded", autosave=False, spacy_model_name=self.model_path)
+        graph.add_document_to_graph(DOCUMENT, "Kant")
+        num_embedded, num_cached, _ = graph.compute_node_embeddings(embedding_cache=embedding_cache)
+        return np.array([node.embedding for node in graph.nodes]), num_embedded, num_cached
+
+    def test_cached_embeddings_match_uncached(self):
+        uncached_embeddings, num_contents, _ = self.embed()
+
+        first_run = self.embed(EmbeddingCache(self.model_path, cache_directory=self.cache_directory))
+        np.testing.assert_allclose(first_run[0], uncached_embeddings, rtol=1e-5, atol=1e-6)
+        self.assertEqual(first_run[1:], (num_contents, 0))
+
+        # A new cache reads the entries saved by the first run, so nothing is embedded again.
+        repeat_run = self.embed(EmbeddingCache(self.model_path, cache_directory=self.cache_directory))
+        np.testing.assert_allclose(repeat_run[0], uncached_embeddings, rtol=1e-5, atol=1e-6)
+        self.assertEqual(repeat_run[1:], (0, num_contents))
+
+    def test_least_recently_used_entry_evicted(self):
+        vectors = np.arange(16, dtype=np.float32).reshape(4, 4)
+        cache = EmbeddingCache("model", cache_directory=self.cache_directory, max_size=3 * vectors[0].nbytes,
+                               initial_entries=1)
+        cache.put(["a", "b", "c"], vectors[:3])
+        cache.get(["a"])
+        cache.put(["d"], vectors[3:])
+        cache.flush()
+
+        found = EmbeddingCache("model", cache_directory=self.cache_directory,
+                               max_size=3 * vectors[0].nbytes).get(["a", "b", "c", "d"])
+        self.assertIsNone(found[1])
+        for i in [0, 2, 3]:
+            np.testing.assert_array_equal(found[i], vectors[i])
+
+
+if __name__ == "__main__":
+    unittest.main()
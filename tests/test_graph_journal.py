@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from KnowledgeGraph.graph_manager import GraphManager
+
+
+DOCUMENTS = {
+    "Kant": {"Life": {"None": ["Kant was born in Konigsberg. He studied there", "Kant wrote the critique of reason"]},
+             "Work": {"None": ["The critique of reason", "The critique of reason"]}},
+    "Hume": {"None": {"None": ["Hume wrote on reason. Kant read Hume", "Hume was born in Edinburgh"]}},
+}
+
+
+def graph_state(graph) -> tuple:
+    """Nodes in order, and edges, of a graph by identifier."""
+
+    nodes = [(node.identifier, node.content) for node in graph.nodes]
+    edges = sorted((edge.parent_node().identifier, edge.child_node().identifier, edge.edge_type, edge.edge_weight)
+                   for edge in graph.edges)
+    return nodes, edges, graph.levels_tally, graph.inferred_entity_count
+
+
+class TestJournalRecovery(unittest.TestCase):
+
+    def setUp(self):
+        self.original_directory = os.getcwd()
+        self.working_directory = tempfile.TemporaryDirectory()
+        os.chdir(self.working_directory.name)
+
+    def tearDown(self):
+        os.chdir(self.original_directory)
+        self.working_directory.cleanup()
+
+    def build_and_recover(self, storage: str):
+        manager = GraphManager(profile=False)
+        manager.create_graph("Journaled", storage=storage, maintained_formats=["journal"])
+        graph = manager.graphs["Journaled"]
+        for document_name, document in DOCUMENTS.items():
+            graph.add_document_to_graph({document_name: document}, document_name)
+        graph.harvest_entity_links()
+        graph.decompose_nodes()
+        graph.delete_node(graph.nodes[2].identifier)
+        graph.create_edge(graph.nodes[0], graph.nodes[-1], "Custom", edge_weight=3)
+        expected_state = graph_state(graph)
+
+        # A crash loses records not yet synced, so recovery is from the last sync.
+        graph.journal.sync()
+        del manager.graphs["Journaled"]
+
+        recovering_manager = GraphManager(profile=False)
+        recovering_manager.recover_graph("Journaled")
+        recovered_graph = recovering_manager.graphs["Journaled"]
+
+        self.assertEqual(recovered_graph.storage, storage)
+        self.assertEqual(graph_state(recovered_graph), expected_state)
+        self.assertEqual(sorted(recovered_graph.node_index), sorted(node.identifier for node in recovered_graph.nodes))
+
+    def test_recovery_matches_graph(self):
+        self.build_and_recover("objects")
+
+    def test_recovery_matches_columnar_graph(self):
+        self.build_and_recover("columnar")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+import unittest
+
+from KnowledgeGraph.graph_manager import GraphManager
+from Utilitites.json_operations import iterate_json_entities
+
+
+def make_document(i: int) -> dict:
+    return {f"Page {i}": {"History": {"None": [f"Page {i} was founded. It grew", f"Page {i} links to Page {i + 1}"]},
+                          "Culture": {"Arts": [f"Arts of page {i}", "A shared paragraph"]},
+                          "None": {"None": [f"Closing words of page {i}. The end"]}}}
+
+
+def graph_state(graph) -> tuple:
+    """Nodes in order, and edges, of a graph by identifier."""
+
+    nodes = [(node.identifier, node.level, node.content) for node in graph.nodes]
+    edges = sorted((edge.parent_node().identifier, edge.child_node().identifier, edge.edge_type, edge.edge_weight)
+                   for edge in graph.edges)
+    return nodes, edges, graph.levels_tally, graph.documents_used
+
+
+class IngestionTestCase(unittest.TestCase):
+    """Writes a directory of entity documents, and builds the serial reference graph from them."""
+
+    def setUp(self):
+        self.original_directory = os.getcwd()
+        self.working_directory = tempfile.TemporaryDirectory()
+        os.chdir(self.working_directory.name)
+
+        self.manager = GraphManager(profile=False)
+        self.entity_directory = "Entities"
+        os.mkdir(self.entity_directory)
+        for i in range(7):
+            with open(f"{self.entity_directory}/Document {i}.json", "w") as file:
+                json.dump(make_document(i), file)
+
+        self.manager.create_graph("Serial")
+        for document_name, document in iterate_json_entities(self.entity_directory):
+            self.manager.graphs["Serial"].add_document_to_graph(document, document_name)
+        self.expected_state = graph_state(self.manager.graphs["Serial"])
+
+    def tearDown(self):
+        self.manager.close()
+        os.chdir(self.original_directory)
+        self.working_directory.cleanup()
+
+
+class TestStreamingIngestion(IngestionTestCase):
+
+    def test_streamed_batches_match_serial(self):
+        self.manager.create_graph("Streamed")
+        self.manager.ingest_json_entities("Streamed", source=self.entity_directory, batch_size=3)
+
+        self.assertEqual(graph_state(self.manager.graphs["Streamed"]), self.expected_state)
+
+    def test_documents_already_added_are_skipped(self):
+        self.manager.create_graph("Streamed")
+        self.manager.ingest_json_entities("Streamed", source=f"{self.entity_directory}/Document [0-3].json")
+        self.manager.ingest_json_entities("Streamed", source=self.entity_directory, batch_size=2)
+
+        self.assertEqual(graph_state(self.manager.graphs["Streamed"]), self.expected_state)
+
+
+class TestParallelIngestion(IngestionTestCase):
+
+    def test_worker_built_documents_match_serial(self):
+        self.manager.create_graph("Parallel")
+        self.manager.add_documents_to_graph("Parallel", dict(iterate_json_entities(self.entity_directory)),
+                                            processes=2)
+
+        self.assertEqual(graph_state(self.manager.graphs["Parallel"]), self.expected_state)
+
+    def test_parallel_streamed_batches_match_serial(self):
+        self.manager.create_graph("Parallel")
+        self.manager.ingest_json_entities("Parallel", source=self.entity_directory, batch_size=3, processes=2)
+
+        self.assertEqual(graph_state(self.manager.graphs["Parallel"]), self.expected_state)
+
+    def test_merged_into_existing_graph(self):
+        # Worker-built documents take their ids on from those already in the graph.
+        documents = list(iterate_json_entities(self.entity_directory))
+        self.manager.create_graph("Parallel")
+        for document_name, document in documents[:2]:
+            self.manager.graphs["Parallel"].add_document_to_graph(document, document_name)
+        self.manager.add_documents_to_graph("Parallel", dict(documents[2:]), processes=2)
+
+        self.assertEqual(graph_state(self.manager.graphs["Parallel"]), self.expected_state)
+
+
+if __name__ == "__main__":
+    unittest.main()
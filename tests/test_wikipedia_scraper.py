@@ -0,0 +1,127 @@
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Webscraper.page_cache import PageCache, PageNotCachedError
+from Webscraper.wikipedia_scraper import WikipediaScraper
+
+
+PAGES = {
+    "Start": '<p>Links to <a href="/wiki/A">A</a> and <a href="/wiki/B">B</a>.</p>'
+             '<p>B again <a href="/wiki/B">B</a>, and a missing page <a href="/wiki/Missing">Missing</a>.</p>',
+    "A": "<p>Page A.</p>",
+    "B": "<p>Page B.</p>",
+}
+
+
+class StandInWikiHandler(BaseHTTPRequestHandler):
+    """Serves PAGES as wiki pages, recording requests and the most requests served at once."""
+
+    response_delay = 0.2
+    requests = Counter()
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = StandInWikiHandler
+        with cls.lock:
+            cls.requests[self.path] += 1
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            time.sleep(cls.response_delay)
+            name = self.path.split("/wiki/")[-1]
+            if name not in PAGES:
+                self.send_error(404)
+                return
+            page = f'<html><head><title>{name} - Wikipedia</title></head><body><h1 id="firstHeading">{name}</h1>' \
+                   f'<div id="mw-content-text">{PAGES[name]}</div></body></html>'
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.end_headers()
+            self.wfile.write(page.encode("utf-8"))
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInWikiTestCase(unittest.TestCase):
+    """Runs a stand-in wiki server for each test."""
+
+    def setUp(self):
+        StandInWikiHandler.requests = Counter()
+        StandInWikiHandler.max_in_flight = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInWikiHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.host = f"127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.stop_server()
+
+    def stop_server(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class TestConcurrentFetching(StandInWikiTestCase):
+
+    def test_degree_one_build(self):
+        start_url = f"http://{self.host}/wiki/Start"
+        scraper = WikipediaScraper(start_url, max_workers=4, requests_per_second=0, wiki_host=self.host)
+
+        documents, links, title = scraper.create_wiki_json_from_article_links(start_url, degree=1)
+
+        self.assertEqual(title, "Start")
+        self.assertEqual(set(documents[0].keys()), {"Start", "A", "B"})
+        # The missing page is skipped, repeated links keep their place.
+        self.assertEqual(links["Start"]["None"]["None"], [["A", "B"], ["B"]])
+        # Linked pages are fetched once each, however often they are linked, and concurrently.
+        self.assertEqual(StandInWikiHandler.requests["/wiki/A"], 1)
+        self.assertEqual(StandInWikiHandler.requests["/wiki/B"], 1)
+        self.assertGreater(StandInWikiHandler.max_in_flight, 1)
+        self.assertEqual(scraper.prefetched_pages, {})
+
+
+class TestOfflineReplay(StandInWikiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache_directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        super().tearDown()
+        self.cache_directory.cleanup()
+
+    def test_cached_crawl_replays_offline(self):
+        start_url = f"http://{self.host}/wiki/Start"
+        online_cache = PageCache(self.cache_directory.name)
+        scraper = WikipediaScraper(start_url, max_workers=4, requests_per_second=0, wiki_host=self.host,
+                                   page_cache=online_cache)
+        online_build = scraper.create_wiki_json_from_article_links(start_url, degree=1)
+        online_cache.close()
+        requests_made = sum(StandInWikiHandler.requests.values())
+
+        # With the server gone, the replay can only be served from the cache.
+        self.stop_server()
+        offline_cache = PageCache(self.cache_directory.name, offline=True)
+        scraper = WikipediaScraper(start_url, max_workers=4, requests_per_second=0, wiki_host=self.host,
+                                   page_cache=offline_cache)
+        offline_build = scraper.create_wiki_json_from_article_links(start_url, degree=1)
+
+        self.assertEqual(offline_build, online_build)
+        self.assertEqual(sum(StandInWikiHandler.requests.values()), requests_made)
+        with self.assertRaises(PageNotCachedError):
+            scraper.fetch_page(f"http://{self.host}/wiki/Missing")
+
+
+if __name__ == "__main__":
+    unittest.main()